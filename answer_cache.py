@@ -0,0 +1,80 @@
+import os
+import re
+from datetime import date, timedelta
+
+from cache import MemoryCache
+from db_tool import data_version, fold_name
+from weather_tool import FORECAST_TOOLS, FORECAST_TTL
+
+# LRU caps for cached answers; the byte cap counts the JSON-encoded entries.
+ANSWER_CACHE_ENTRIES = int(os.environ.get("BOULDER_ANSWER_CACHE_ENTRIES", 1024))
+ANSWER_CACHE_MAX_BYTES = int(os.environ.get("BOULDER_ANSWER_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+# Database-only answers are keyed by the routes.db version, so an ingest retires them.
+# This just stops them from sitting in the cache forever otherwise.
+DB_ANSWER_TTL = 24 * 3600
+
+# Questions that mention a relative day mean something different tomorrow.
+_RELATIVE_DAY = re.compile(r"\b(?:today|tonight|tomorrow|now|week|weekend|(?:mon|tues|wednes|thurs|fri|satur|sun)day)\b")
+
+_cache = MemoryCache(maxsize=ANSWER_CACHE_ENTRIES, max_bytes=ANSWER_CACHE_MAX_BYTES)
+
+
+def configure_answer_cache(maxsize: int = ANSWER_CACHE_ENTRIES, max_bytes: int | None = ANSWER_CACHE_MAX_BYTES):
+    """Replaces the answer cache, e.g. to change its caps. Drops everything cached so far."""
+    global _cache
+    _cache = MemoryCache(maxsize=maxsize, max_bytes=max_bytes)
+
+
+def answer_cache_stats() -> dict:
+    """Returns hit/miss counters, size and evictions of the answer cache."""
+    return _cache.stats()
+
+
+def normalize_query(prompt: str) -> str:
+    """Lowercases, strips accents and punctuation, and collapses whitespace."""
+    return " ".join(re.sub(r"[^\w]+", " ", fold_name(prompt)).split())
+
+
+def cache_key(prompt: str, intent: dict | None = None) -> str:
+    """
+    Builds the cache key for a prompt.
+
+    When router.resolve found the name in the database, the key is the intent plus
+    the name and date, so "is Powerlinez dry?" and "conditions at powerlinez today"
+    share an entry. Otherwise it is the normalized text, dated only if it mentions a
+    relative day. Either way the routes.db version is part of the key.
+    """
+    if intent:
+        day = intent["day"]
+        if day:
+            day = (date.today() + timedelta(days=1 if day == "tomorrow" else 0)).isoformat()
+        base = f"{intent['intent']}:{normalize_query(intent['name'])}:{day or ''}"
+    else:
+        query = normalize_query(prompt)
+        base = f"q:{query}"
+        if _RELATIVE_DAY.search(query):
+            base += f":{date.today().isoformat()}"
+    return f"{data_version()}|{base}"
+
+
+def get_answer(key: str) -> dict | None:
+    """Returns the cached {'answer', 'tool_calls'} for key, or None."""
+    return _cache.get(key)
+
+
+def store_answer(key: str, answer: str, tool_calls: list[dict]) -> bool:
+    """
+    Caches an answer with a lifetime based on the tools that produced it.
+
+    Answers that used no tools (nothing to be fresh against) or that hit a tool error
+    are not cached. Returns whether the answer was stored.
+    """
+    if not tool_calls or any(call.get("error") for call in tool_calls):
+        return False
+    # Tools mark themselves with weather_tool.forecast_tool
+    if any(call["function"] in FORECAST_TOOLS for call in tool_calls):
+        ttl = FORECAST_TTL
+    else:
+        ttl = DB_ANSWER_TTL
+    _cache.set(key, {"answer": answer, "tool_calls": tool_calls}, ttl)
+    return True
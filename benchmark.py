@@ -0,0 +1,537 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import tracing
+from trace_report import load_traces, print_report, summarize
+
+# Replayed when no recorded queries are available. Tool calls are issued in order,
+# one per model turn, the way the agent usually chains them.
+SAMPLE_QUERIES = [
+    {"user_query": "Is Powerlinez dry today?", "tool_calls": []},
+    {"user_query": "What grade is Torch?", "tool_calls": []},
+    {"user_query": "List the V3 to V5 problems at Peterskill", "tool_calls": [
+        {"function": "run_sql_query", "args": {"sql_query": (
+            "SELECT name, grade, crag FROM boulders WHERE area = 'Gunks' AND sub_area = 'Peterskill Bouldering' "
+            "AND grade_num BETWEEN 3 AND 5 ORDER BY grade_num")}},
+    ]},
+    {"user_query": "How many problems are in each Gunks area?", "tool_calls": [
+        {"function": "run_sql_query", "args": {"sql_query": (
+            "SELECT sub_area, COUNT(*) FROM boulders WHERE area LIKE '%Gunks%' GROUP BY sub_area")}},
+    ]},
+    {"user_query": "What are the closest V4s to Torch?", "tool_calls": [
+        {"function": "get_coordinates", "args": {"location_name": "Torch", "location_type": "climb"}},
+        {"function": "find_nearby", "args": {"lat": 41.14492, "lng": -74.16226, "limit": 5,
+                                             "min_grade": "V4", "max_grade": "V4"}},
+    ]},
+    {"user_query": "How are conditions at the Trapps this Saturday?", "tool_calls": [
+        {"function": "get_coordinates", "args": {"location_name": "Trapps Bouldering"}},
+        {"function": "get_bouldering_weather", "args": {"lat": 41.7411, "lng": -74.1835}},
+    ]},
+    {"user_query": "Compare Powerlinez, Peterskill and the Trapps for today", "tool_calls": [
+        {"function": "get_bouldering_weather_many", "args": {
+            "lats": [41.1454, 41.7390, 41.7411], "lngs": [-74.1665, -74.2152, -74.1835],
+            "names": ["Powerlinez", "Peterskill", "Trapps"]}},
+    ]},
+    {"user_query": "When should I go to Powerlinez or the Trapps this week?", "tool_calls": [
+        {"function": "plan_send_days", "args": {
+            "lats": [41.1454, 41.7411], "lngs": [-74.1665, -74.1835], "names": ["Powerlinez", "Trapps"]}},
+    ]},
+    {"user_query": "Where is Gorilla Monsoon Boulder?", "tool_calls": [
+        {"function": "get_coordinates", "args": {"location_name": "Gorilla Monsoon Boulder"}},
+    ]},
+]
+
+# Tool-level probes timed directly against the database, outside the agent loop.
+SQL_PROBES = [
+    ("get_coordinates exact", "get_coordinates", {"location_name": "Powerlinez"}),
+    ("get_coordinates climb", "get_coordinates", {"location_name": "Torch", "location_type": "climb"}),
+    ("get_coordinates fuzzy", "get_coordinates", {"location_name": "Powrlinez Boulderng"}),
+    ("find_names", "find_names", {"location_name": "Tarzan", "kind": "boulder"}),
+    ("find_nearby", "find_nearby", {"lat": 41.14492, "lng": -74.16226, "limit": 10}),
+    ("find_in_box", "find_in_box", {"min_lat": 41.0, "min_lng": -74.5, "max_lat": 42.0, "max_lng": -74.0}),
+    ("sql grade range", "run_sql_query", {"sql_query": (
+        "SELECT name, grade FROM boulders WHERE area = 'Gunks' AND sub_area = 'Peterskill Bouldering' "
+        "AND grade_num BETWEEN 3 AND 5 ORDER BY grade_num")}),
+    ("sql group by", "run_sql_query", {"sql_query": "SELECT sub_area, COUNT(*) FROM boulders GROUP BY sub_area"}),
+    ("sql counts", "run_sql_query", {"sql_query": (
+        "SELECT SUM(boulders) FROM boulder_counts WHERE crag = 'Welcome Boulders' AND grade_bucket = 3")}),
+]
+
+
+# --- Open-Meteo stand-in ---
+
+def _stub_location(lat: float, lng: float, query: dict) -> dict:
+    if "forecast_days" in query:
+        start = date.today() - timedelta(days=int(query.get("past_days", ["0"])[0]))
+        end = date.today() + timedelta(days=int(query["forecast_days"][0]) - 1)
+    else:
+        start = date.fromisoformat(query["start_date"][0])
+        end = date.fromisoformat(query["end_date"][0])
+    days = [start + timedelta(days=d) for d in range((end - start).days + 1)]
+    hours = [f"{d}T{h:02d}:00" for d in days for h in range(24)]
+
+    def fields(key):
+        return [name for value in query.get(key, []) for name in value.split(",") if name]
+
+    # Smooth, deterministic weather so verdicts vary a little between places and days
+    seed = math.sin(lat * 12.9898 + lng * 78.233)
+    hourly = {"time": hours}
+    for name in fields("hourly"):
+        if name == "temperature_2m":
+            hourly[name] = [round(45 + 12 * math.sin((i % 24 - 9) / 24 * 2 * math.pi) + 8 * seed, 1) for i in range(len(hours))]
+        elif name == "relative_humidity_2m":
+            hourly[name] = [int(55 + 20 * seed + 10 * math.cos(i / 24 * 2 * math.pi)) for i in range(len(hours))]
+        elif name == "is_day":
+            hourly[name] = [1 if 7 <= i % 24 < 19 else 0 for i in range(len(hours))]
+        elif name == "weather_code":
+            hourly[name] = [61 if seed > 0.8 and i % 24 == 15 else 2 for i in range(len(hours))]
+        else:
+            hourly[name] = [0.01 if seed > 0.5 and i % 24 == 15 else 0.0 for i in range(len(hours))]
+    daily = {"time": [str(d) for d in days]}
+    for name in fields("daily"):
+        if name == "sunrise":
+            daily[name] = [f"{d}T07:00" for d in days]
+        elif name == "sunset":
+            daily[name] = [f"{d}T18:30" for d in days]
+        else:
+            daily[name] = [round(max(seed, 0) * 0.1, 2) for _ in days]
+    return {"latitude": lat, "longitude": lng, "hourly": hourly, "daily": daily}
+
+
+class _OpenMeteoHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        time.sleep(self.latency)
+        # Like the real archive API, refuse dates it can't have data for yet
+        if url.path.endswith("/archive") and date.fromisoformat(query["end_date"][0]) > date.today():
+            body = json.dumps({"error": True, "reason": "end_date is out of the allowed range"}).encode()
+            self.send_response(400)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        lats = query["latitude"][0].split(",")
+        lngs = query["longitude"][0].split(",")
+        results = [_stub_location(float(a), float(b), query) for a, b in zip(lats, lngs)]
+        body = json.dumps(results if len(results) > 1 else results[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_weather_stub(latency: float = 0.0) -> str:
+    """Serves fake archive/forecast responses on localhost and returns the base URL."""
+    handler = type("Handler", (_OpenMeteoHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="open-meteo-stub", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+# --- OpenBeta stand-in ---
+
+def build_area_tree(depth: int = 3, fan: int = 5, climbs: int = 4) -> tuple[str, dict]:
+    """
+    Builds a fixed OpenBeta-style area tree: fan children per area, depth levels below
+    the root, and climbs boulder problems on every area.
+
+    Returns (root uuid, {uuid: area payload}). Uuids are derived from names, so the
+    same arguments always give the same tree.
+    """
+    tree = {}
+
+    def add(name, level, lat, lng):
+        area_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"stub-area:{name}"))
+        children = [add(f"{name}.{i}", level + 1, lat + 0.01 * i, lng + 0.01 * level)
+                    for i in range(fan)] if level < depth else []
+        tree[area_id] = {
+            "areaName": name,
+            "metadata": {"lat": round(lat, 5), "lng": round(lng, 5)},
+            "children": [{"uuid": child, "areaName": tree[child]["areaName"]} for child in children],
+            "climbs": [{
+                "uuid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"stub-climb:{name}:{j}")),
+                "name": f"{name} Problem {j}",
+                "content": {"description": ""},
+                "grades": {"vscale": f"V{j % 10}"},
+                "type": {"bouldering": True},
+            } for j in range(climbs)],
+        }
+        return area_id
+
+    root = add("Stub", 0, 41.0, -74.0)
+    return root, tree
+
+
+class _OpenBetaHandler(BaseHTTPRequestHandler):
+    tree = {}
+    latency = 0.0
+    state = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+        with self.state["lock"]:
+            self.state["requests"] += 1
+            failing = self.state["fail_after"] is not None and self.state["requests"] > self.state["fail_after"]
+        if failing:
+            self.send_response(400)
+            self.end_headers()
+            return
+        body = json.dumps({"data": {"area": self.tree.get(payload["variables"]["id"])}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_openbeta_stub(tree: dict, latency: float = 0.0) -> tuple[str, dict]:
+    """
+    Serves tree (see build_area_tree) as an OpenBeta GraphQL endpoint on localhost.
+
+    Returns the URL and the stub's live state: 'requests' counts the queries
+    answered, and setting 'fail_after' to n makes every query after the n-th fail
+    (None turns failures off again).
+    """
+    state = {"requests": 0, "fail_after": None, "lock": threading.Lock()}
+    handler = type("Handler", (_OpenBetaHandler,), {"tree": tree, "latency": latency, "state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="openbeta-stub", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", state
+
+
+# --- Gemini stand-in ---
+
+class _Text:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModels:
+    """
+    Replays recorded tool calls in place of client.models.
+
+    For each prompt it answers turn n with the n-th recorded call, then with a short
+    text answer once the calls run out. latency is added before every response.
+    """
+
+    def __init__(self, scripts: dict, latency: float = 0.0):
+        self.scripts = scripts
+        self.latency = latency
+
+    def generate_content_stream(self, model, contents, config=None):
+        from google.genai import types
+
+        start = max(i for i, c in enumerate(contents)
+                    if c.role == "user" and c.parts and c.parts[0].text)
+        prompt = contents[start].parts[0].text
+        turn = sum(1 for c in contents[start:] if c.role == "model")
+        calls = self.scripts.get(prompt, [])
+        time.sleep(self.latency)
+        if turn < len(calls):
+            call = types.FunctionCall(name=calls[turn]["function"], args=calls[turn]["args"])
+            parts = [[types.Part(function_call=call)]]
+        else:
+            parts = [[types.Part(text=word + " ")] for word in f"Replayed answer for: {prompt}".split()]
+        for chunk in parts:
+            yield types.GenerateContentResponse(
+                candidates=[types.Candidate(content=types.Content(role="model", parts=chunk))]
+            )
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latency)
+        return _Text("Replayed summary.")
+
+
+class FakeClient:
+    def __init__(self, scripts: dict, latency: float = 0.0):
+        self.models = FakeModels(scripts, latency)
+
+
+# --- Workload ---
+
+def load_queries(paths: list[str]) -> list[dict]:
+    """
+    Reads {'user_query', 'tool_calls'} entries from trace-style JSONL files.
+
+    Lines with 'query' or 'prompt' instead of 'user_query' are accepted too. Tool
+    calls the agent can't make (e.g. router lookups) are dropped. Falls back to
+    SAMPLE_QUERIES when nothing usable is found.
+    """
+    from boulder_engine import TOOL_FUNCTIONS
+
+    queries = []
+    for path in paths:
+        for entry in load_traces(path):
+            prompt = entry.get("user_query") or entry.get("query") or entry.get("prompt")
+            if not prompt:
+                continue
+            calls = [c for c in entry.get("tool_calls", []) if c.get("function") in TOOL_FUNCTIONS]
+            queries.append({"user_query": prompt, "tool_calls": calls})
+    return queries or SAMPLE_QUERIES
+
+
+def build_synthetic_db(src: str, dest: str, factor: int):
+    """
+    Writes a copy of src with every area and climb repeated factor times.
+
+    Copy k gets '#k' appended to its names and uuids and is shifted by whole half
+    degrees, so each copy keeps the original's local density and hierarchy.
+    """
+    from populate_db import create_schema, index_names
+
+    if os.path.exists(dest):
+        os.remove(dest)
+    conn = sqlite3.connect(dest)
+    create_schema(conn)
+    conn.execute("ATTACH DATABASE ? AS src", (src,))
+    for k in range(factor):
+        params = {
+            "tag": f"#{k}" if k else "",
+            "sfx": f" #{k}" if k else "",
+            "dlat": (k % 10) * 0.5,
+            "dlng": (k // 10) * 0.5,
+        }
+        conn.execute('''INSERT INTO areas (uuid, name, lat, lng, parent_name, parent_uuid, content_hash, synced_at)
+                        SELECT uuid || :tag, name || :sfx, lat + :dlat, lng + :dlng, parent_name || :sfx,
+                               parent_uuid || :tag, content_hash, synced_at FROM src.areas''', params)
+        conn.execute('''INSERT INTO boulders (uuid, area, sub_area, crag, rock, name, grade, description,
+                                              lat, lng, grade_num, area_uuid)
+                        SELECT uuid || :tag, area || :sfx, sub_area || :sfx, crag || :sfx, rock || :sfx,
+                               name || :sfx, grade, description, lat + :dlat, lng + :dlng, grade_num,
+                               area_uuid || :tag FROM src.boulders''', params)
+    conn.commit()
+    conn.execute("DETACH DATABASE src")
+    index_names(conn)
+    conn.commit()
+    conn.close()
+
+
+def time_sql(iterations: int) -> dict:
+    """Runs each SQL_PROBES tool call iterations times and returns its latencies (ms)."""
+    import db_tool
+
+    timings = {}
+    for label, function, args in SQL_PROBES:
+        func = getattr(db_tool, function)
+        func(**args)  # warm the pool and page cache
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func(**args)
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[f"sql:{label}"] = samples
+    return timings
+
+
+def replay(queries: list[dict], total: int, concurrency: int, llm_latency: float) -> tuple:
+    """
+    Pushes total queries through process_query from concurrency worker threads.
+
+    Each worker plays one Streamlit session with its own AgentSession. Returns
+    (wall seconds, trace entries recorded during the run).
+    """
+    from boulder_engine import AgentSession, process_query
+
+    class _Status:
+        def write(self, *args, **kwargs):
+            pass
+
+    scripts = {q["user_query"]: q["tool_calls"] for q in queries}
+    client = FakeClient(scripts, llm_latency)
+    local = threading.local()
+
+    def run(i):
+        if not hasattr(local, "session"):
+            local.session = AgentSession(client)
+        process_query(queries[i % len(queries)]["user_query"], _Status(), local.session)
+
+    fd, path = tempfile.mkstemp(suffix=".jsonl", prefix="bench-traces-")
+    os.close(fd)
+    previous, tracing.writer = tracing.writer, tracing.TraceWriter(path)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(run, range(total)))
+        elapsed = time.perf_counter() - start
+        tracing.writer.flush()
+        entries = load_traces(path)
+    finally:
+        tracing.writer = previous
+        os.remove(path)
+    return elapsed, entries
+
+
+def bench_ingest(workdir: str, workers: list[int], latency: float, depth: int, fan: int):
+    """
+    Runs populate_db.ingest against the OpenBeta stand-in.
+
+    Times a fresh ingest at each worker count, then checks that a run killed
+    halfway resumes from its checkpoint to the same rows, and that a --sync run
+    after a rename rewrites only what changed.
+    """
+    import requests
+    from populate_db import create_schema, ingest
+
+    root, tree = build_area_tree(depth, fan)
+    url, state = start_openbeta_stub(tree, latency)
+    roots = [(root, [])]
+    expected = (len(tree), sum(len(area["climbs"]) for area in tree.values()))
+
+    def fresh_db(name):
+        path = os.path.join(workdir, name)
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        create_schema(conn)
+        return conn
+
+    def counts(conn):
+        return conn.execute("SELECT (SELECT COUNT(*) FROM areas), (SELECT COUNT(*) FROM boulders)").fetchone()
+
+    print(f"=== Ingest: {expected[0]} areas, {expected[1]} climbs, {latency * 1000:.0f} ms per request ===")
+    # ingest() prints a line per node
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    for n in workers:
+        conn = fresh_db(f"ingest_{n}.db")
+        with quiet:
+            stats = ingest(conn, roots, url=url, workers=n, fresh=True)
+        print(f"{n:>3} workers: {stats['nodes']} nodes in {stats['seconds']}s = {stats['nodes_per_sec']} nodes/s")
+        conn.close()
+
+    conn = fresh_db("ingest_resume.db")
+    state["requests"], state["fail_after"] = 0, len(tree) // 2
+    with quiet:
+        try:
+            ingest(conn, roots, url=url, workers=max(workers))
+        except requests.RequestException:
+            pass
+    interrupted = counts(conn)
+    state["fail_after"] = None
+    with quiet:
+        stats = ingest(conn, roots, url=url, workers=max(workers))
+    print(f"resume: died at {interrupted[0]} areas, finished {stats['nodes']} remaining nodes -> "
+          f"{'OK' if tuple(counts(conn)) == expected else f'MISMATCH {counts(conn)}'}")
+
+    renamed = tree[tree[root]["children"][0]["uuid"]]
+    renamed["areaName"] += " (renamed)"
+    with quiet:
+        stats = ingest(conn, roots, url=url, workers=max(workers), sync=True)
+    indexed = conn.execute("SELECT COUNT(*) FROM name_index WHERE name LIKE '%(renamed)%'").fetchone()[0]
+    print(f"sync after a rename: {len(stats['changed_areas'])} areas and {len(stats['changed_climbs'])} climbs "
+          f"rewritten, {len(stats['deleted'])} tombstoned, new name {'indexed' if indexed else 'MISSING'}")
+    conn.close()
+
+
+def _disable_caches():
+    import answer_cache
+    import weather_tool
+
+    answer_cache.configure_answer_cache(maxsize=0, max_bytes=None)
+    weather_tool.configure_cache("memory", maxsize=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Offline replay benchmark: fake Gemini, stub Open-Meteo, real tools and SQLite")
+    parser.add_argument("--queries", nargs="*", default=[tracing.TRACE_PATH],
+                        help="Trace-style JSONL files to replay (default: traces.jsonl, else built-in samples)")
+    parser.add_argument("--db", default="data/routes.db")
+    parser.add_argument("--requests", type=int, default=200, help="Queries per run")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated worker counts")
+    parser.add_argument("--scale", default="1,10,100", help="Comma-separated database size multipliers")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds added to each fake model call")
+    parser.add_argument("--weather-latency", type=float, default=0.05, help="Seconds added to each stub weather call")
+    parser.add_argument("--sql-iterations", type=int, default=200)
+    parser.add_argument("--warm", action="store_true", help="Keep the answer and weather caches on")
+    parser.add_argument("--precompute", action="store_true",
+                        help="Fill the conditions store before each run so area weather is a local read")
+    parser.add_argument("--workdir", default=None, help="Where to build the scaled databases (default: a temp dir)")
+    parser.add_argument("--ingest", action="store_true",
+                        help="Benchmark populate_db against a stub OpenBeta tree instead of replaying queries")
+    parser.add_argument("--ingest-workers", default="1,8,16", help="Comma-separated ingest worker counts")
+    parser.add_argument("--openbeta-latency", type=float, default=0.05, help="Seconds added to each stub OpenBeta call")
+    parser.add_argument("--tree", default="3,5", help="Stub area tree as depth,fan-out")
+    args = parser.parse_args()
+
+    if args.ingest:
+        workdir = args.workdir or tempfile.mkdtemp(prefix="boulder-bench-")
+        os.makedirs(workdir, exist_ok=True)
+        depth, fan = (int(x) for x in args.tree.split(","))
+        try:
+            bench_ingest(workdir, [int(x) for x in args.ingest_workers.split(",")], args.openbeta_latency, depth, fan)
+        finally:
+            if args.workdir is None:
+                shutil.rmtree(workdir, ignore_errors=True)
+        raise SystemExit
+
+    import conditions
+    import db_tool
+    import weather_tool
+
+    base_url = start_weather_stub(args.weather_latency)
+    weather_tool.ARCHIVE_URL = f"{base_url}/v1/archive"
+    weather_tool.FORECAST_URL = f"{base_url}/v1/forecast"
+    if not args.warm:
+        _disable_caches()
+
+    queries = load_queries(args.queries)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="boulder-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    # Stub weather must never end up in the real conditions store
+    conditions.configure_store(os.path.join(workdir, "conditions.db"))
+    print(f"--- {len(queries)} distinct queries, {args.requests} per run, caches {'on' if args.warm else 'off'} ---")
+
+    try:
+        for factor in (int(x) for x in args.scale.split(",")):
+            db_path = args.db
+            if factor > 1:
+                db_path = os.path.join(workdir, f"routes_{factor}x.db")
+                start = time.perf_counter()
+                build_synthetic_db(args.db, db_path, factor)
+                print(f"\nbuilt {factor}x database in {time.perf_counter() - start:.1f}s "
+                      f"({os.path.getsize(db_path) / 1e6:.1f} MB)")
+            db_tool.configure_pool(db_path)
+
+            print(f"\n=== {factor}x: SQLite tool timings (ms, {args.sql_iterations} runs) ===")
+            print_report(time_sql(args.sql_iterations))
+
+            if args.precompute:
+                start = time.perf_counter()
+                rows = conditions.refresh()
+                print(f"\nprecomputed {rows} conditions rows in {time.perf_counter() - start:.2f}s")
+
+            for workers in (int(x) for x in args.concurrency.split(",")):
+                elapsed, entries = replay(queries, args.requests, workers, args.llm_latency)
+                print(f"\n=== {factor}x, {workers} sessions: {len(entries)} requests in {elapsed:.2f}s "
+                      f"= {len(entries) / elapsed:.1f} req/s ===")
+                print_report(summarize(entries))
+    finally:
+        db_tool.configure_pool()
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -1,9 +1,15 @@
-import datetime
 import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 import streamlit as st
 from google.genai import Client, types
-from db_tool import get_coordinates, run_sql_query
-from weather_tool import get_bouldering_weather
+from db_tool import find_in_box, find_nearby, get_coordinates, run_sql_query
+from weather_tool import get_bouldering_weather, get_bouldering_weather_many
+from answer_cache import cache_key, get_answer, store_answer
+from router import resolve, route
+from send_planner import plan_send_days
+from tracing import bind, span, trace, traced_tool
 
 SYSTEM_PROMPT = """
 You are a local bouldering expert and guide. 
@@ -20,8 +26,24 @@ DATABASE SCHEMA:
   Use this for: "How is the weather at Powerlinez?" or "Where is the Trapps?"
   
 - Table 'boulders': Contains specific bouldering routes and rocks. 
-  Columns: [uuid, area, sub_area, crag, rock, name, grade, lat, lng]
+  Columns: [uuid, area, sub_area, crag, rock, name, grade, grade_num, lat, lng]
   Use this for: "Where is the climb 'Paul Bunyan'?" or "List V3s in Peterskill."
+  'grade_num' is the numeric grade (V3 = 3, V3+ = 3.5, V3-4 = 3.5, VB = -1) and is indexed
+  as (area, sub_area, grade_num). Use it for ranges and sorting by difficulty instead of
+  matching 'grade' text, e.g. "V3 to V5 at Peterskill":
+  WHERE area = 'Gunks' AND sub_area = 'Peterskill Bouldering' AND grade_num BETWEEN 3 AND 5
+  ORDER BY grade_num
+  The index only helps with exact area and sub_area values, not LIKE '%...%'. Look the
+  exact values up first with: SELECT area, sub_area FROM gps_coverage
+
+- Table 'boulder_counts': Precomputed boulder counts, one row per (area, sub_area, crag,
+  rock, grade_bucket). Columns: [area, sub_area, crag, rock, grade_bucket, boulders, with_gps]
+  'grade_bucket' is the number on the grade (V3-, V3, V3+ and V3-4 are all 3; VB = -1;
+  NULL if ungraded). Use it for "how many" questions instead of COUNT(*) over 'boulders',
+  e.g. "How many V3s are at the Welcome Boulders?":
+  SELECT SUM(boulders) FROM boulder_counts WHERE crag = 'Welcome Boulders' AND grade_bucket = 3
+- View 'grade_histogram': [area, sub_area, grade_bucket, boulders], the grade spread per sub-area.
+- View 'gps_coverage': [area, sub_area, boulders, with_gps, missing_gps] per sub-area.
 
 TOOLS & WORKFLOW:
 1. COORDINATES (Geocoding): 
@@ -29,10 +51,22 @@ TOOLS & WORKFLOW:
    - This tool is smart: it checks 'areas' first, then 'boulders'.
 2. DATA: 
    - Use 'run_sql_query' for specific lists (e.g., "Show me all V4s").
+   - Use 'find_nearby' for proximity questions ("problems within 500 m of here",
+     "closest V4s to the parking lot") and 'find_in_box' for a lat/lng bounding box.
+     Never compute distances in SQL.
+   - Row results are columnar: 'columns' names the fields of each row in 'rows',
+     'constants' holds fields that are the same in every row, and "^" means "same as
+     the row above". If 'next_cursor' is present, call 'run_sql_query' with only
+     cursor=<next_cursor> for the next page instead of re-running a bigger query.
 3. WEATHER: 
     - You MUST NEVER call 'get_bouldering_weather' unless you have lat/lng.
     - You MUST call 'get_coordinates' first to get lat/lng.
     - Once you have lat/lng, call 'get_bouldering_weather'.
+    - To compare several crags on one date, call 'get_bouldering_weather_many' once
+      with all of their lat/lng values instead of one 'get_bouldering_weather' per crag.
+    - For "when should I go" or "best day this week" questions, call 'plan_send_days' once
+      with every candidate crag. It ranks the next 7-14 days and gives each day's best
+      4-hour send window, so never loop 'get_bouldering_weather' over dates.
 
 RESPONSE GUIDELINES:
 - Always report Temperature and Humidity in your summary.
@@ -47,64 +81,347 @@ EXAMPLE RESPONSE:
 "The conditions at Powerlinez are **Green**! It's currently a crisp 45°F with 35% humidity—perfect friction. No rain is reported, so the rock should be dry."
 """
 
-@st.cache_resource
-def get_agent_instance():
-    """Initializes the model once and keeps it in memory."""
-    client = Client(api_key=st.secrets["GEMINI_API_KEY"])
-    model_id = "gemini-2.5-flash-lite" 
-    
-    tools = [run_sql_query, get_coordinates, get_bouldering_weather]
-    
-    agent_config = types.GenerateContentConfig(
-        system_instruction=SYSTEM_PROMPT,
-        tools=tools,
-        # Automatic function calling handles the chain (Coords -> Weather)
+MODEL_ID = "gemini-2.5-flash-lite"
+TOOLS = [
+    run_sql_query, get_coordinates, find_nearby, find_in_box,
+    get_bouldering_weather, get_bouldering_weather_many, plan_send_days
+]
+# Each tool call shows up as a span in the trace
+TOOL_FUNCTIONS = {tool.__name__: traced_tool(tool) for tool in TOOLS}
+# Give up on the tool chain after this many model turns
+MAX_TOOL_ROUNDS = 6
+# Calls the model makes in the same turn run side by side on this many threads.
+# Kept separate from weather_tool's HTTP pool, which the tools themselves submit to.
+TOOL_WORKERS = 16
+
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+# One per pool thread. Calls only go to the pool when a slot is free, so a busy session
+# never leaves another one's calls queued behind its own
+_tool_slots = threading.BoundedSemaphore(TOOL_WORKERS)
+# History summaries are written here, off the request path
+_summary_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="summary")
+
+# History sent with each request is kept under this many (estimated) tokens. Once
+# it goes over, the oldest turns are folded into the summary until it is back
+# under half the budget, so compaction only runs every few turns.
+HISTORY_TOKEN_BUDGET = 6000
+# Tool results longer than this (JSON chars) are cut down once their turn is answered.
+TOOL_RESULT_KEEP_CHARS = 800
+SUMMARY_MAX_CHARS = 2000
+SUMMARY_PROMPT = (
+    "Summarize this bouldering chat for the assistant that will continue it. Keep the places, "
+    "climbs, grades, dates and conditions verdicts that were discussed, plus any user preferences. "
+    "Use at most 120 words.\n\n"
+)
+
+
+def _agent_config(mode: str, summary: str | None = None) -> types.GenerateContentConfig:
+    instruction = SYSTEM_PROMPT
+    if summary:
+        instruction += f"\nEARLIER IN THIS CONVERSATION:\n{summary}\n"
+    return types.GenerateContentConfig(
+        system_instruction=instruction,
+        tools=list(TOOL_FUNCTIONS.values()),
+        # We run the tool chain (Coords -> Weather) ourselves so tool calls can be
+        # shown as they happen and the answer can be streamed
         automatic_function_calling=types.AutomaticFunctionCallingConfig(
-            disable=False
+            disable=True
         ),
-        # Forced function calling ensures the agent doesn't "lazily" ignore tools
         tool_config=types.ToolConfig(
             function_calling_config=types.FunctionCallingConfig(
-                mode="ANY", 
-                allowed_function_names=["run_sql_query", "get_coordinates", "get_bouldering_weather"]
+                mode=mode, 
+                allowed_function_names=list(TOOL_FUNCTIONS) if mode == "ANY" else None
             )
         )
     )
-    
-    chat = client.chats.create(
-        model=model_id,
-        config=agent_config
-    )
-    return chat
-
-
-def process_query(prompt, status_callback):
-    """Sends the prompt to Gemini and handles the response logic."""
-    chat = get_agent_instance()
-    
-    status_callback.write("Querying the boulder-agent...")
-    
-    response = chat.send_message(prompt)
-
-    trace_entry = {
-        "timestamp": datetime.datetime.now().isoformat(),
-        "user_query": prompt,
-        "tool_calls": [],
-        "final_answer": response.text
-    }
-    
-    for part in response.candidates[0].content.parts:
-        if part.function_call:
-            call_data = {
-                "function": part.function_call.name,
-                "args": part.function_call.args
-            }
-            trace_entry["tool_calls"].append(call_data)
-            
-            status_callback.write(f"🛠️ **Calling Tool:** `{call_data['function']}`")
-            status_callback.write(f"Parameters: `{call_data['args']}`")
-
-    with open("traces.jsonl", "a") as f:
-        f.write(json.dumps(trace_entry) + "\n")
-            
-    return response.text
\ No newline at end of file
+
+
+def _estimate_tokens(contents: list) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return sum(len(c.model_dump_json(exclude_none=True)) for c in contents) // 4
+
+
+def _transcript(turns: list) -> str:
+    lines = []
+    for turn in turns:
+        for content in turn:
+            for part in content.parts or []:
+                if part.text:
+                    speaker = "User" if content.role == "user" else "Assistant"
+                    lines.append(f"{speaker}: {part.text.strip()}")
+                elif part.function_call:
+                    lines.append(f"(called {part.function_call.name} {dict(part.function_call.args or {})})")
+    return "\n".join(lines)
+
+
+class AgentSession:
+    """
+    One user's conversation with the agent.
+
+    History lives here rather than in a genai Chat so it can be trimmed: each turn
+    is stored as its list of contents (prompt, tool calls, tool results, answer),
+    bulky tool results are pruned once answered, and older turns are compacted into
+    a summary that rides along in the system instruction. The model writes that
+    summary in the background; until it is ready the tail of the plain transcript
+    stands in, so compaction never delays an answer.
+    """
+
+    def __init__(self, client, model: str = MODEL_ID, token_budget: int = HISTORY_TOKEN_BUDGET):
+        self.client = client
+        self.model = model
+        self.token_budget = token_budget
+        self.summary = None
+        self.turns = []
+        self._pending_summary = None
+
+    def contents(self, pending: list) -> list:
+        """The history to send along with the turn in progress."""
+        return [content for turn in self.turns for content in turn] + pending
+
+    def config(self, mode: str) -> types.GenerateContentConfig:
+        self._collect_summary()
+        return _agent_config(mode, self.summary)
+
+    def stream(self, pending: list, mode: str):
+        return self.client.models.generate_content_stream(
+            model=self.model, contents=self.contents(pending), config=self.config(mode)
+        )
+
+    def tokens(self) -> int:
+        self._collect_summary()
+        return _estimate_tokens(self.contents([])) + len(self.summary or "") // 4
+
+    def commit(self, turn: list):
+        """Adds a finished turn to the history, then prunes and compacts."""
+        for content in turn:
+            for part in content.parts or []:
+                response = part.function_response
+                if response is None:
+                    continue
+                text = json.dumps(response.response, default=str)
+                if len(text) > TOOL_RESULT_KEEP_CHARS:
+                    # The model already answered from this, keep just enough to refer back to it
+                    response.response = {"pruned": True, "preview": text[:TOOL_RESULT_KEEP_CHARS // 4]}
+        self.turns.append(turn)
+
+        if self.tokens() <= self.token_budget:
+            return
+        dropped = []
+        while len(self.turns) > 1 and self.tokens() > self.token_budget // 2:
+            dropped.append(self.turns.pop(0))
+        if dropped:
+            self._collect_summary()
+            transcript = _transcript(dropped)
+            if self.summary:
+                transcript = f"Summary so far: {self.summary}\n{transcript}"
+            # The tail of the plain transcript stands in until the model's summary lands.
+            # A newer request replaces an older one still running; it covers the same turns.
+            self.summary = transcript[-SUMMARY_MAX_CHARS:].strip()
+            if self._pending_summary is not None:
+                self._pending_summary.cancel()
+            self._pending_summary = _summary_executor.submit(self._summarize, transcript)
+
+    def _collect_summary(self):
+        """Swaps in the background summary once it is ready, without waiting for it."""
+        pending = self._pending_summary
+        if pending is None or not pending.done():
+            return
+        self._pending_summary = None
+        text = pending.result()
+        if text:
+            self.summary = text[-SUMMARY_MAX_CHARS:].strip()
+
+    def _summarize(self, transcript: str) -> str | None:
+        with span("summarize_history", "llm", request_bytes=len(transcript.encode())):
+            try:
+                return self.client.models.generate_content(
+                    model=self.model, contents=SUMMARY_PROMPT + transcript
+                ).text
+            except Exception:
+                # A missing summary only costs context, never the answer
+                return None
+
+
+@st.cache_resource
+def get_client() -> Client:
+    """One Gemini client (and connection pool) shared by every session."""
+    return Client(api_key=st.secrets["GEMINI_API_KEY"])
+
+
+def get_agent_session() -> AgentSession:
+    """The AgentSession of the current Streamlit session, created on first use."""
+    if "agent_session" not in st.session_state:
+        st.session_state.agent_session = AgentSession(get_client())
+    return st.session_state.agent_session
+
+
+def _run_tool(call) -> dict:
+    try:
+        result = TOOL_FUNCTIONS[call.name](**(call.args or {}))
+    except Exception as e:
+        # Let the model see the failure instead of killing the whole answer
+        result = {"error": f"{type(e).__name__}: {e}"}
+    if not isinstance(result, dict):
+        result = {"value": result, "row_count": 0 if result is None else 1}
+    # Every response says how much it returned so the model (and traces) can tell
+    result.setdefault("row_count", 0 if "error" in result else 1)
+    result["payload_bytes"] = len(json.dumps(result, default=str))
+    return {"result": result}
+
+
+def _timed_tool(call) -> tuple[dict, float]:
+    start = time.perf_counter()
+    response = _run_tool(call)
+    return response, round((time.perf_counter() - start) * 1000, 2)
+
+
+def _pooled_tool(call) -> tuple[dict, float]:
+    try:
+        return _timed_tool(call)
+    finally:
+        _tool_slots.release()
+
+
+def _run_tools(calls) -> list[tuple[dict, float]]:
+    """
+    Runs one turn's tool calls, concurrently when there are several.
+
+    The calls in a turn don't depend on each other (the model can't see any of
+    their results yet), so the turn takes about as long as its slowest call.
+    The first call runs on the caller's thread, as does any call that finds the
+    shared pool full. Returns (response, duration_ms) pairs in call order.
+    """
+    jobs = [calls[0]]
+    for call in calls[1:]:
+        if _tool_slots.acquire(blocking=False):
+            jobs.append(_tool_executor.submit(bind(_pooled_tool), call))
+        else:
+            jobs.append(call)
+    # Inline calls first, so they overlap with the pooled ones
+    results = [None if isinstance(job, Future) else _timed_tool(job) for job in jobs]
+    return [job.result() if isinstance(job, Future) else result for job, result in zip(jobs, results)]
+
+
+def process_query_stream(prompt, status_callback, session: AgentSession | None = None):
+    """
+    Sends the prompt to Gemini and yields the answer text as it streams in.
+
+    Repeated questions are served from the answer cache, and prompts the router
+    recognizes are answered directly from the tools. Otherwise
+    tool calls are executed between model turns and reported on status_callback
+    as they happen; calls from the same turn run concurrently. The first turn
+    forces a tool call; follow-up turns let the
+    model either call more tools or answer. session defaults to the current
+    Streamlit session's.
+    """
+    with trace(user_query=prompt, tool_calls=[]) as trace_entry:
+        # TTFT covers everything the user waits through: cache lookup, routing and the model
+        started = time.perf_counter()
+        session = session or get_agent_session()
+        turn = [types.Content(role="user", parts=[types.Part(text=prompt)])]
+
+        # Questions can lean on earlier turns ("what about tomorrow?", "is it dry?"), so
+        # answers are only shared between sessions when the router resolved a real name
+        # or the question opened the chat
+        intent = resolve(prompt)
+        key = cache_key(prompt, intent) if intent or not session.turns else None
+        cached = get_answer(key) if key else None
+        trace_entry["cache"] = "skip" if key is None else ("hit" if cached else "miss")
+        if cached:
+            trace_entry["route"] = "cache"
+            trace_entry["cached_tool_calls"] = cached["tool_calls"]
+            status_callback.write("♻️ **Answered from cache**")
+            trace_entry["final_answer"] = cached["answer"]
+            trace_entry["ttft_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            yield cached["answer"]
+            session.commit(turn + [types.Content(role="model", parts=[types.Part(text=cached["answer"])])])
+            return
+
+        # Common intents ("conditions at X", "grade of Y") skip the model entirely
+        fast = route(prompt, intent)
+        if fast:
+            trace_entry["route"] = f"fast:{fast['intent']}"
+            for call_data in fast["tool_calls"]:
+                trace_entry["tool_calls"].append(call_data)
+                status_callback.write(f"⚡ **Fast path:** `{call_data['function']}`")
+                status_callback.write(f"Parameters: `{call_data['args']}`")
+            trace_entry["final_answer"] = fast["answer"]
+            trace_entry["ttft_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            yield fast["answer"]
+            if key and fast["cacheable"]:
+                store_answer(key, fast["answer"], fast["tool_calls"])
+            # Keep it in the history so follow-ups still make sense to the model
+            session.commit(turn + [types.Content(role="model", parts=[types.Part(text=fast["answer"])])])
+            return
+
+        trace_entry["route"] = "agent"
+        status_callback.write("Querying the boulder-agent...")
+
+        answer = []
+        # Forced function calling ensures the agent doesn't "lazily" ignore tools
+        mode = "ANY"
+        for _ in range(MAX_TOOL_ROUNDS):
+            calls = []
+            parts = []
+            text = []
+            with span("generate_content_stream", "llm", context_tokens=_estimate_tokens(session.contents(turn))) as record:
+                for chunk in session.stream(turn, mode):
+                    if not chunk.candidates or not chunk.candidates[0].content:
+                        continue
+                    for part in chunk.candidates[0].content.parts or []:
+                        if part.function_call:
+                            calls.append(part.function_call)
+                            parts.append(part)
+                        elif part.text and not part.thought:
+                            if not answer:
+                                trace_entry["ttft_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                            answer.append(part.text)
+                            text.append(part.text)
+                            yield part.text
+                record["response_bytes"] = len("".join(text).encode())
+
+            if text:
+                parts.append(types.Part(text="".join(text)))
+            if parts:
+                turn.append(types.Content(role="model", parts=parts))
+            if not calls:
+                break
+
+            turn_calls = []
+            for call in calls:
+                call_data = {
+                    "function": call.name,
+                    "args": dict(call.args or {})
+                }
+                trace_entry["tool_calls"].append(call_data)
+                turn_calls.append(call_data)
+
+                status_callback.write(f"🛠️ **Calling Tool:** `{call_data['function']}`")
+                status_callback.write(f"Parameters: `{call_data['args']}`")
+
+            responses = []
+            for call, call_data, (response, duration_ms) in zip(calls, turn_calls, _run_tools(calls)):
+                call_data["duration_ms"] = duration_ms
+                call_data["row_count"] = response["result"]["row_count"]
+                call_data["payload_bytes"] = response["result"]["payload_bytes"]
+                if "error" in response["result"]:
+                    call_data["error"] = True
+                responses.append(types.Part.from_function_response(name=call.name, response=response))
+            turn.append(types.Content(role="user", parts=responses))
+            mode = "AUTO"
+
+        if not answer:
+            answer.append("I cannot find that in my database.")
+            turn.append(types.Content(role="model", parts=[types.Part(text=answer[0])]))
+            trace_entry["ttft_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            yield answer[0]
+        elif key:
+            store_answer(key, "".join(answer), trace_entry["tool_calls"])
+        trace_entry["final_answer"] = "".join(answer)
+        session.commit(turn)
+        trace_entry["history_tokens"] = session.tokens()
+
+
+def process_query(prompt, status_callback, session: AgentSession | None = None):
+    """Sends the prompt to Gemini and returns the full answer."""
+    return "".join(process_query_stream(prompt, status_callback, session))
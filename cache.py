@@ -0,0 +1,141 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Base class for the key/value caches used by the tools.
+
+    Every entry carries its own time-to-live so callers can mix long-lived data
+    (e.g. archived weather) with short-lived data (forecasts) in one cache.
+    Subclasses implement _load/_store; this class keeps the hit/miss counters.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Returns the cached value for key, or None if it is missing or expired."""
+        value = self._load(key, time.time())
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value, ttl: float):
+        """Stores a JSON-serializable value for ttl seconds."""
+        self._store(key, value, time.time() + ttl)
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters. Every hit is an upstream call we didn't make."""
+        total = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def _load(self, key, now):
+        raise NotImplementedError
+
+    def _store(self, key, value, expires_at):
+        raise NotImplementedError
+
+
+class MemoryCache(TTLCache):
+    """
+    In-process LRU cache. Fast, but lost whenever Streamlit restarts.
+
+    Bounded by entry count and, optionally, by max_bytes of JSON-encoded values;
+    the least recently used entries are evicted first when either cap is hit.
+    """
+
+    def __init__(self, maxsize: int = 512, max_bytes: int | None = None):
+        super().__init__()
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def _load(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key, value, expires_at):
+        size = len(json.dumps(value, default=str)) if self.max_bytes else 0
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._entries[key] = (value, expires_at, size)
+            self.bytes += size
+            while len(self._entries) > self.maxsize or (self.max_bytes and self.bytes > self.max_bytes
+                                                        and len(self._entries) > 1):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["entries"] = len(self._entries)
+        stats["evictions"] = self.evictions
+        if self.max_bytes:
+            stats["bytes"] = self.bytes
+            stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+class SQLiteCache(TTLCache):
+    """Cache backed by a small SQLite file so entries survive app restarts."""
+
+    def __init__(self, path: str = "data/cache.db"):
+        super().__init__()
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS cache
+                              (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)''')
+        self._conn.commit()
+
+    def _load(self, key, now):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        return json.loads(row[0])
+
+    def _store(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            # Opportunistically drop dead rows so the file doesn't grow forever
+            self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats["entries"] = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return stats
@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+from db_tool import get_connection
+
+# Precomputed verdicts live in their own file so routes.db stays read-only
+# (and the read pool isn't recycled every time the scheduler writes).
+CONDITIONS_DB = os.environ.get("BOULDER_CONDITIONS_DB", "data/conditions.db")
+# Today plus the next few days
+CONDITIONS_DAYS = 4
+# How often the scheduler recomputes everything, in seconds. 0 turns it off.
+REFRESH_INTERVAL = int(os.environ.get("BOULDER_CONDITIONS_REFRESH", 30 * 60))
+# Rows older than this are ignored and the tool goes back to a live fetch.
+# Forecast models update hourly, so anything older may have been revised.
+STALE_AFTER = 60 * 60
+# Locations per Open-Meteo request during a refresh
+REFRESH_BATCH = 50
+
+
+class ConditionsStore:
+    """
+    SQLite table of precomputed get_bouldering_weather reports.
+
+    Rows are keyed by date and by the forecast and archive grid cells the report
+    was computed from, so any point inside the same pair of cells reads the same
+    row (Open-Meteo would have answered it with the same data anyway).
+    """
+
+    def __init__(self, path: str = CONDITIONS_DB):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS conditions
+                              (date TEXT, f_lat REAL, f_lng REAL, a_lat REAL, a_lng REAL,
+                               report TEXT, computed_at REAL,
+                               PRIMARY KEY (date, f_lat, f_lng, a_lat, a_lng)) WITHOUT ROWID''')
+        self._conn.commit()
+
+    def get(self, day: str, cells: tuple, max_age: float = STALE_AFTER) -> dict | None:
+        """Returns the stored report for day and cells, or None if it is missing or stale."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT report, computed_at FROM conditions WHERE date = ? AND f_lat = ? AND f_lng = ? "
+                "AND a_lat = ? AND a_lng = ?", (day, *cells)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[1] < time.time() - max_age:
+                self.stale += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put_many(self, rows: list[tuple]):
+        """Stores (day, cells, report) rows, replacing what was there."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO conditions (date, f_lat, f_lng, a_lat, a_lng, report, computed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(day, *cells, json.dumps(report), now) for day, cells, report in rows]
+            )
+            # Days in the past will never be asked for again
+            self._conn.execute("DELETE FROM conditions WHERE date < ?", ((date.today() - timedelta(days=1)).isoformat(),))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.stale
+        with self._lock:
+            rows, newest = self._conn.execute("SELECT COUNT(*), MAX(computed_at) FROM conditions").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "rows": rows,
+            "age_s": round(time.time() - newest) if newest else None,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+_scheduler = None
+_scheduler_stats = {"runs": 0, "locations": 0, "stored": 0, "last_run": None, "last_seconds": None, "last_error": None}
+
+
+def get_store() -> ConditionsStore:
+    """Returns the process-wide conditions store, opening it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConditionsStore()
+    return _store
+
+
+def configure_store(path: str = CONDITIONS_DB):
+    """Points the conditions store at another file."""
+    global _store
+    with _store_lock:
+        _store = ConditionsStore(path)
+
+
+def refresh(days: int = CONDITIONS_DAYS) -> int:
+    """
+    Recomputes the report for every distinct area location, today through days - 1.
+
+    Areas whose coordinates fall into the same grid cells are fetched once. Reports
+    that came back partial or with an error are not stored. Returns the rows written.
+    """
+    # weather_tool reads from this module, so only pull it in when we actually refresh
+    from weather_tool import conditions_cells, evaluate_locations
+
+    with get_connection() as conn:
+        points = conn.execute("SELECT DISTINCT lat, lng FROM areas WHERE lat IS NOT NULL AND lng IS NOT NULL").fetchall()
+    by_cells = {}
+    for lat, lng in points:
+        by_cells.setdefault(conditions_cells(lat, lng), (lat, lng))
+    coords = list(by_cells.values())
+
+    stored = 0
+    for offset in range(days):
+        day = (date.today() + timedelta(days=offset)).isoformat()
+        for i in range(0, len(coords), REFRESH_BATCH):
+            batch = coords[i:i + REFRESH_BATCH]
+            _, reports = evaluate_locations(batch, day, use_store=False)
+            rows = [
+                (day, conditions_cells(lat, lng), report) for (lat, lng), report in zip(batch, reports)
+                if "error" not in report and not report.get("partial")
+            ]
+            get_store().put_many(rows)
+            stored += len(rows)
+    _scheduler_stats["locations"] = len(coords)
+    return stored
+
+
+def _run(interval: float, stop: threading.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            _scheduler_stats["stored"] = refresh()
+            _scheduler_stats["last_error"] = None
+        except Exception as e:
+            # Keep going, the tools fall back to live fetches in the meantime
+            _scheduler_stats["last_error"] = f"{type(e).__name__}: {e}"
+        _scheduler_stats["runs"] += 1
+        _scheduler_stats["last_run"] = time.time()
+        _scheduler_stats["last_seconds"] = round(time.perf_counter() - started, 2)
+        stop.wait(interval)
+
+
+def start_scheduler(interval: float = REFRESH_INTERVAL) -> threading.Event | None:
+    """
+    Starts the background refresh thread (once per process).
+
+    The first refresh runs immediately. Returns an Event that stops the thread when
+    set, or None if the interval is 0.
+    """
+    global _scheduler
+    with _store_lock:
+        if _scheduler is None and interval > 0:
+            _scheduler = threading.Event()
+            threading.Thread(target=_run, args=(interval, _scheduler), name="conditions-refresh", daemon=True).start()
+    return _scheduler
+
+
+def conditions_stats() -> dict:
+    """Store hit/miss/stale counters plus the scheduler's last run."""
+    return {**get_store().stats(), "scheduler": dict(_scheduler_stats)}
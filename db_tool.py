@@ -1,8 +1,356 @@
+import itertools
+import math
+import os
+import queue
+import secrets
 import sqlite3
 import re
+import threading
+import time
+import unicodedata
+from contextlib import closing, contextmanager
+from cache import MemoryCache
+from tracing import span
 
 DB_PATH = 'data/routes.db'
 
+# Read connections are pooled and shared by every Streamlit session in the process.
+DB_POOL_SIZE = int(os.environ.get("BOULDER_DB_POOL_SIZE", 4))
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_STATEMENT_CACHE = 256
+# immutable=1 skips all file locking. Only turn it on if re-ingestion swaps in a new
+# file (os.replace) rather than writing to routes.db in place.
+DB_IMMUTABLE = os.environ.get("BOULDER_DB_IMMUTABLE") == "1"
+# Copy the whole database into RAM at startup and serve reads from the copy.
+DB_IN_MEMORY = os.environ.get("BOULDER_DB_IN_MEMORY") == "1"
+
+
+
+class ReadPool:
+    """
+    Thread-safe pool of read-only connections to one SQLite file.
+
+    Connections are opened lazily (mode=ro, optionally immutable=1) with mmap and a
+    prepared-statement cache, and handed out with the connection() context manager.
+    In in_memory mode the file is copied into a shared-cache memory database once and
+    every pooled connection reads from that snapshot.
+
+    The file's mtime/size/inode is checked on every checkout. When it changes (a
+    re-ingest finished), the pool starts a new generation: idle connections are
+    closed, in-flight ones are closed when returned, and the snapshot is reloaded.
+    """
+
+    def __init__(self, path: str, size: int = DB_POOL_SIZE, immutable: bool = DB_IMMUTABLE,
+                 in_memory: bool = DB_IN_MEMORY):
+        self.path = path
+        self.size = size
+        self.immutable = immutable
+        self.in_memory = in_memory
+        self._lock = threading.Lock()
+        self._idle = queue.LifoQueue()
+        self._open_count = 0
+        self._generation = 0
+        self._signature = None
+        self._snapshot = None
+        self._stats = {"checkouts": 0, "waits": 0, "opened": 0, "recycled": 0}
+
+    def _file_signature(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _refresh(self):
+        # Called with the lock held
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        self._signature = signature
+        self._generation += 1
+        while True:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            self._open_count -= 1
+            self._stats["recycled"] += 1
+        if self.in_memory:
+            if self._snapshot is not None:
+                self._snapshot.close()
+            # The anchor connection keeps the shared memory database alive
+            self._snapshot_uri = f"file:routes_snapshot_{id(self)}_{self._generation}?mode=memory&cache=shared"
+            self._snapshot = sqlite3.connect(self._snapshot_uri, uri=True, check_same_thread=False)
+            source = sqlite3.connect(self._uri(), uri=True)
+            source.backup(self._snapshot)
+            source.close()
+
+    def _uri(self) -> str:
+        uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+        if self.immutable:
+            uri += "&immutable=1"
+        return uri
+
+    def _open(self) -> sqlite3.Connection:
+        uri = self._snapshot_uri if self.in_memory else self._uri()
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE)
+        conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        conn.execute("PRAGMA query_only = 1")
+        register_functions(conn)
+        self._stats["opened"] += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Checks out a connection for the duration of the with block."""
+        conn = None
+        with self._lock:
+            self._refresh()
+            generation = self._generation
+            self._stats["checkouts"] += 1
+            try:
+                conn_generation, conn = self._idle.get_nowait()
+            except queue.Empty:
+                if self._open_count < self.size:
+                    conn = self._open()
+                    conn_generation = generation
+                    self._open_count += 1
+        if conn is None:
+            # Pool exhausted, wait for someone to hand a connection back
+            with self._lock:
+                self._stats["waits"] += 1
+            conn_generation, conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                if conn_generation == self._generation:
+                    self._idle.put((conn_generation, conn))
+                else:
+                    conn.close()
+                    self._open_count -= 1
+                    self._stats["recycled"] += 1
+                    # Make sure anyone blocked in get() can still make progress
+                    if self._open_count < self.size:
+                        self._idle.put((self._generation, self._open()))
+                        self._open_count += 1
+
+    def version(self) -> str:
+        """Identifies the database file's current contents; it changes whenever an ingest rewrites it."""
+        return "{}-{}-{}".format(*self._file_signature())
+
+    def stats(self) -> dict:
+        """Returns pool counters (size, open/idle connections, checkouts, waits, recycles)."""
+        with self._lock:
+            return {
+                "path": self.path,
+                "mode": "memory" if self.in_memory else ("immutable" if self.immutable else "ro"),
+                "size": self.size,
+                "open": self._open_count,
+                "idle": self._idle.qsize(),
+                "generation": self._generation,
+                **self._stats,
+            }
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    _, conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+                self._open_count -= 1
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+
+
+_pool = ReadPool(DB_PATH)
+
+
+def configure_pool(path: str = DB_PATH, **kwargs):
+    """Replaces the shared read pool, e.g. to point the tools at another database file."""
+    global _pool
+    old, _pool = _pool, ReadPool(path, **kwargs)
+    old.close()
+
+
+def get_connection():
+    """Context manager yielding a pooled read-only connection to routes.db."""
+    return _pool.connection()
+
+
+def data_version() -> str:
+    """Version string of routes.db, for caches that must not outlive an ingest."""
+    return _pool.version()
+
+
+def pool_stats() -> dict:
+    """Returns connection pool counters."""
+    return _pool.stats()
+
+
+# Guardrails for the SQL the model writes through run_sql_query.
+SQL_TIME_BUDGET = 2.0
+SQL_FETCH_SIZE = 100
+# Plans that fully scan a table bigger than this are rejected before running.
+FULL_SCAN_ROW_LIMIT = 50_000
+
+# Everything a plain SELECT needs; writes, PRAGMA, ATTACH etc. are denied.
+_READ_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+
+
+# Row-returning tools send results back in pages of this many rows; run_sql_query
+# hands out a cursor token for the next page. The token only remembers the query and
+# how far it got: each page re-runs the query and skips the rows already sent, so
+# page n costs O(n * SQL_PAGE_ROWS) rows under the same time budget. Fine for the
+# few pages a conversation reads, not for walking a whole table.
+SQL_PAGE_ROWS = 50
+CURSOR_TTL = 10 * 60
+# Ambiguous get_coordinates lookups list at most this many options.
+COORD_OPTIONS = 25
+# Hierarchy values repeat down sorted results, so compact_rows writes "^" for
+# "same as the row above" in these columns.
+HIERARCHY_COLUMNS = {"area", "sub_area", "crag", "rock", "parent_name", "context", "category"}
+
+# cursor token -> {"sql", "offset"} for run_sql_query pagination
+_cursors = MemoryCache(maxsize=256)
+
+
+def compact_rows(rows: list[dict]) -> dict:
+    """
+    Encodes a list of row dicts column-wise to keep tool results small.
+
+    Returns 'columns' and 'rows' (lists of values in column order). Columns holding
+    the same value in every row move to 'constants', and repeated values in
+    HIERARCHY_COLUMNS are replaced by "^" (same as the previous row).
+    """
+    if not rows:
+        return {"columns": [], "rows": []}
+    columns = list(rows[0])
+    constants = {}
+    if len(rows) > 1:
+        constants = {c: rows[0][c] for c in columns if all(r[c] == rows[0][c] for r in rows)}
+        columns = [c for c in columns if c not in constants]
+
+    out = []
+    previous = {}
+    for row in rows:
+        values = []
+        for c in columns:
+            value = row[c]
+            values.append("^" if c in HIERARCHY_COLUMNS and value is not None and previous.get(c) == value else value)
+        previous = row
+        out.append(values)
+
+    result = {"columns": columns, "rows": out}
+    if constants:
+        result["constants"] = constants
+    return result
+
+
+# Fuzzy matches must share at least this fraction of the query's trigrams.
+FUZZY_THRESHOLD = 0.5
+# How many candidates the fuzzy pass pulls from the index before re-scoring.
+FUZZY_CANDIDATES = 50
+
+
+def _execute(cursor, sql: str, params=()) -> list:
+    """Runs a tool query and fetches its rows, recorded as an 'sql' span."""
+    with span("query", "sql", sql=" ".join(sql.split())[:200]) as record:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        record["rows"] = len(rows)
+        return rows
+
+
+def fold_name(text: str | None) -> str:
+    """Lowercases and strips accents so 'Cañón' and 'canon' match in name_index."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def name_alias(text: str | None) -> str:
+    """
+    The folded name without the decoration OpenBeta adds around place names.
+
+    Drops a leading 'the', '*' or list number ('2. ') and a trailing 'Bouldering' or
+    'Boulders', so '* Powerlinez Bouldering' and 'powerlinez' share the alias 'powerlinez'.
+    """
+    alias = fold_name(text).strip()
+    alias = re.sub(r"^(?:the\s+|\*\s*|\d+\.\s*)+", "", alias)
+    alias = re.sub(r"\s+(?:bouldering|boulders)$", "", alias)
+    return " ".join(alias.split())
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _search_names(cursor, kind: str, name: str, parent: str | None, fuzzy: bool) -> list:
+    """
+    Looks up areas or boulders through the name_index trigram index.
+
+    The exact pass matches the folded name as a substring (what LIKE '%x%' used to do).
+    The fuzzy pass ORs the individual trigrams together, so typos still hit, and keeps
+    candidates sharing at least FUZZY_THRESHOLD of them. Both come back best match first.
+    """
+    if kind == "area":
+        select = "SELECT a.lat, a.lng, a.name, a.parent_name, n.name FROM name_index n JOIN areas a ON a.uuid = n.uuid"
+    else:
+        select = "SELECT b.lat, b.lng, b.name, b.area, b.sub_area, n.name FROM name_index n JOIN boulders b ON b.uuid = n.uuid"
+
+    query_grams = _trigrams(name)
+    if fuzzy:
+        match = "name : (" + " OR ".join(_quote(g) for g in sorted(query_grams)) + ")"
+    else:
+        match = f"name : {_quote(name)}"
+    if parent:
+        match += f" AND context : {_quote(parent)}"
+
+    rows = _execute(
+        cursor,
+        f"{select} WHERE name_index MATCH ? AND n.kind = ? ORDER BY n.rank LIMIT ?",
+        (match, kind, FUZZY_CANDIDATES if fuzzy else -1)
+    )
+    if not fuzzy:
+        return [r[:-1] for r in rows]
+
+    scored = []
+    for r in rows:
+        overlap = len(query_grams & _trigrams(r[-1])) / len(query_grams)
+        if overlap >= FUZZY_THRESHOLD:
+            scored.append((overlap, r[:-1]))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [r for _, r in scored]
+
+
+def _like_names(cursor, kind: str, location_name: str, parent_area: str | None) -> list:
+    # Trigrams need at least three characters, so very short names still go through LIKE
+    if kind == "area":
+        query = "SELECT lat, lng, name, parent_name FROM areas WHERE name LIKE ?"
+        params = [f"%{location_name}%"]
+        if parent_area:
+            query += " AND parent_name LIKE ?"
+            params.append(f"%{parent_area}%")
+    else:
+        query = "SELECT lat, lng, name, area, sub_area FROM boulders WHERE name LIKE ?"
+        params = [f"%{location_name}%"]
+        if parent_area:
+            query += " AND (area LIKE ? OR sub_area LIKE ?)"
+            params.extend([f"%{parent_area}%", f"%{parent_area}%"])
+    return _execute(cursor, query, params)
+
+
 def get_coordinates(location_name: str, location_type: str | None = None, parent_area: str | None = None) -> dict | None:
     """
     Retrieves the latitude and longitude for a specific location.
@@ -10,6 +358,8 @@ def get_coordinates(location_name: str, location_type: str | None = None, parent
     This function searches for coordinates in the 'areas' and 'boulders' tables.
     It supports filtering by location type and handles ambiguity by returning a list of options
     if multiple matches are found (unless a unique Area match is found first).
+    Matching ignores case and accents, and falls back to typo-tolerant matching
+    when nothing contains the name exactly. Options are ordered best match first.
 
     Args:
         location_name: The name of the rock, climb, or location to search for.
@@ -21,47 +371,46 @@ def get_coordinates(location_name: str, location_type: str | None = None, parent
 
     Returns:
         dict: A dictionary containing 'lat', 'lng', and 'type' if a unique location is found.
-              If multiple matches are found, returns a dictionary with 'ambiguous': True
-              and a list of 'options'.
+              If multiple matches are found, returns a dictionary with 'ambiguous': True,
+              the best 'options' (columnar: name, context, category), 'row_count' and
+              'truncated'. Pass parent_area to narrow a truncated list down.
         None: If no matching location is found.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        return _get_coordinates(conn.cursor(), location_name, location_type, parent_area)
 
+
+def _get_coordinates(cursor, location_name, location_type, parent_area):
     # Determine what to search based on location_type
     search_areas = not location_type or location_type.lower() in ["area", "location"]
     search_boulders = not location_type or location_type.lower() in ["rock", "boulder", "climb", "route", "point"]
 
-    area_results = []
-    if search_areas:
-        area_query = "SELECT lat, lng, name, parent_name FROM areas WHERE name LIKE ?"
-        area_params = [f"%{location_name}%"]
-
-        if parent_area:
-            area_query += " AND parent_name LIKE ?"
-            area_params.append(f"%{parent_area}%")
-
-        cursor.execute(area_query, area_params)
-        area_results = cursor.fetchall()
-
-        if len(area_results) == 1:
-            conn.close()
-            return {"lat": float(area_results[0][0]), "lng": float(area_results[0][1]), "type": "area"}
+    name = fold_name(location_name).strip()
+    parent = fold_name(parent_area).strip() if parent_area else None
+    use_index = len(name) >= 3 and (not parent or len(parent) >= 3)
 
+    area_results = []
     boulder_results = []
-    if search_boulders:
-        # This captures specific climbs or rocks if the area search was empty or too broad
-        boulder_query = "SELECT lat, lng, name, area, sub_area FROM boulders WHERE name LIKE ?"
-        boulder_params = [f"%{location_name}%"]
+    # Exact substring matches win; only go fuzzy when there are none at all
+    for fuzzy in ([False, True] if use_index else [None]):
+        if search_areas:
+            if use_index:
+                area_results = _search_names(cursor, "area", name, parent, fuzzy)
+            else:
+                area_results = _like_names(cursor, "area", location_name, parent_area)
 
-        if parent_area:
-            boulder_query += " AND (area LIKE ? OR sub_area LIKE ?)"
-            boulder_params.extend([f"%{parent_area}%", f"%{parent_area}%"])
+            if len(area_results) == 1:
+                return {"lat": float(area_results[0][0]), "lng": float(area_results[0][1]), "type": "area"}
 
-        cursor.execute(boulder_query, boulder_params)
-        boulder_results = cursor.fetchall()
+        if search_boulders:
+            # This captures specific climbs or rocks if the area search was empty or too broad
+            if use_index:
+                boulder_results = _search_names(cursor, "boulder", name, parent, fuzzy)
+            else:
+                boulder_results = _like_names(cursor, "boulder", location_name, parent_area)
 
-    conn.close()
+        if area_results or boulder_results:
+            break
 
     # Combine results to check for total ambiguity
     total_matches = area_results + boulder_results
@@ -81,25 +430,62 @@ def get_coordinates(location_name: str, location_type: str | None = None, parent
 
     return {
         "ambiguous": True,
-        "options": options
+        "options": compact_rows(options[:COORD_OPTIONS]),
+        "row_count": min(len(options), COORD_OPTIONS),
+        "truncated": len(options) > COORD_OPTIONS
     }
 
-def normalize_grade(grade_str: str) -> float:
+def find_names(location_name: str, kind: str) -> list[dict]:
+    """
+    Exact (non-fuzzy) name lookup for areas or boulders, best match first.
+
+    Unlike get_coordinates this never guesses: it only returns rows whose folded name
+    contains location_name, and flags the ones that equal it outright. Boulder rows
+    also carry their grade. Names shorter than three characters return nothing.
+    """
+    name = fold_name(location_name).strip()
+    if len(name) < 3:
+        return []
+    if kind == "area":
+        select = ("SELECT a.name, a.lat, a.lng, n.name, NULL, a.parent_name "
+                  "FROM name_index n JOIN areas a ON a.uuid = n.uuid")
+    else:
+        select = ("SELECT b.name, b.lat, b.lng, n.name, b.grade, b.area, b.sub_area, b.crag "
+                  "FROM name_index n JOIN boulders b ON b.uuid = n.uuid")
+    with get_connection() as conn:
+        rows = _execute(
+            conn.cursor(),
+            f"{select} WHERE name_index MATCH ? AND n.kind = ? ORDER BY n.rank",
+            (f"name : {_quote(name)}", kind)
+        )
+    return [
+        {"name": r[0], "lat": r[1], "lng": r[2], "exact": r[3].strip() == name,
+         "grade": r[4], "context": " > ".join(filter(None, r[5:]))}
+        for r in rows
+    ]
+
+
+def normalize_grade(grade_str: str) -> float | None:
     """
     Converts a grade string to a float value.
+
+    'V3' -> 3.0, 'V3+' -> 3.5, 'V3-' -> 2.5, 'V3-4' -> 3.5, 'VB' -> -1.0.
     
     Args:
         grade_str (str): The grade string to normalize.
     
     Returns:
-        float: The normalized grade .
+        float: The normalized grade, or None for ungraded climbs ('V?').
     """
     grade = grade_str.upper().strip()
     if "VB" in grade:
         return -1.0
     num = re.findall(r'\d+', grade)
+    if not num:
+        return None
     if len(num) == 2:
-        return float(num[0]) + float(num[1]) / 2
+        # Slash grades sit halfway between the two numbers
+        return (float(num[0]) + float(num[1])) / 2
     val = float(num[0])
     if "+" in grade:
         val += 0.5
@@ -107,31 +493,264 @@ def normalize_grade(grade_str: str) -> float:
         val -= 0.5
     return val
 
-    
-    
-def run_sql_query(sql_query: str) -> list:
+
+def _sql_normalize_grade(grade_str):
+    return normalize_grade(grade_str) if isinstance(grade_str, str) else None
+
+
+def register_functions(conn: sqlite3.Connection):
+    """Registers the Python helpers as SQL functions, e.g. normalize_grade(grade)."""
+    conn.create_function("normalize_grade", 1, _sql_normalize_grade, deterministic=True)
+
+
+EARTH_RADIUS_M = 6_371_000
+# How far find_nearby widens its search before giving up on finding `limit` results.
+MAX_SEARCH_RADIUS_M = 50_000
+
+
+def _haversine_m(lat1, lng1, lat2, lng2) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _box_query(cursor, kind: str, box: tuple, min_grade: str | None, max_grade: str | None, limit: int = -1) -> list:
+    """Probes the R*Tree for everything inside box = (min_lat, min_lng, max_lat, max_lng)."""
+    if kind == "area":
+        sql = '''SELECT t.name, t.parent_name, t.lat, t.lng FROM areas_rtree r
+                 JOIN areas t ON t.rowid = r.id'''
+    else:
+        sql = '''SELECT t.name, t.grade, t.area, t.sub_area, t.crag, t.rock, t.lat, t.lng FROM boulders_rtree r
+                 JOIN boulders t ON t.rowid = r.id'''
+    sql += " WHERE r.min_lat >= ? AND r.max_lat <= ? AND r.min_lng >= ? AND r.max_lng <= ?"
+    params = [box[0], box[2], box[1], box[3]]
+    if kind != "area":
+        if min_grade:
+            sql += " AND t.grade_num >= ?"
+            params.append(normalize_grade(min_grade))
+        if max_grade:
+            sql += " AND t.grade_num <= ?"
+            params.append(normalize_grade(max_grade))
+    sql += " LIMIT ?"
+    params.append(limit)
+
+    rows = _execute(cursor, sql, params)
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _radius_box(lat: float, lng: float, radius_m: float) -> tuple:
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    d_lng = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return (lat - d_lat, lng - d_lng, lat + d_lat, lng + d_lng)
+
+
+def find_nearby(lat: float, lng: float, radius_m: float | None = None, limit: int = 10,
+                kind: str = "boulder", min_grade: str | None = None, max_grade: str | None = None) -> dict:
+    """
+    Finds the climbs (or areas) closest to a point, nearest first.
+
+    Use this for proximity questions such as "what problems are within 500 m of here" or
+    "closest V4s to the parking lot", instead of writing distance math in SQL.
+    Call get_coordinates first if you only have a place name.
+
+    Args:
+        lat (float): Latitude of the reference point.
+        lng (float): Longitude of the reference point.
+        radius_m (float, optional): Only return results within this many meters.
+                                    If omitted, returns the `limit` nearest results.
+        limit (int): Maximum number of results. Defaults to 10.
+        kind (str): "boulder" (default) to search climbs, or "area" to search areas.
+        min_grade (str, optional): Lowest grade to include, e.g. "V3". Climbs only.
+        max_grade (str, optional): Highest grade to include, e.g. "V5". Climbs only.
+
+    Returns:
+        dict: 'results' (columnar rows of name, grade/hierarchy or parent, lat, lng and
+              'distance_m') and 'row_count'.
+    """
+    radius = radius_m if radius_m else 250
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        while True:
+            rows = _box_query(cursor, kind, _radius_box(lat, lng, radius), min_grade, max_grade)
+            for row in rows:
+                row["distance_m"] = round(_haversine_m(lat, lng, row["lat"], row["lng"]))
+            # The box's corners reach past the radius, so only count what's inside the circle
+            rows = [row for row in rows if row["distance_m"] <= radius]
+            if radius_m or len(rows) >= limit or radius >= MAX_SEARCH_RADIUS_M:
+                break
+            radius *= 2
+
+    rows.sort(key=lambda row: row["distance_m"])
+    rows = rows[:limit]
+    return {"results": compact_rows(rows), "row_count": len(rows)}
+
+
+def find_in_box(min_lat: float, min_lng: float, max_lat: float, max_lng: float, limit: int = 50,
+                kind: str = "boulder", min_grade: str | None = None, max_grade: str | None = None) -> dict:
+    """
+    Lists the climbs (or areas) inside a latitude/longitude bounding box.
+
+    Args:
+        min_lat (float): Southern edge of the box.
+        min_lng (float): Western edge of the box.
+        max_lat (float): Northern edge of the box.
+        max_lng (float): Eastern edge of the box.
+        limit (int): Maximum number of results. Defaults to 50.
+        kind (str): "boulder" (default) to search climbs, or "area" to search areas.
+        min_grade (str, optional): Lowest grade to include, e.g. "V3". Climbs only.
+        max_grade (str, optional): Highest grade to include, e.g. "V5". Climbs only.
+
+    Returns:
+        dict: 'results' (columnar rows of name, grade/hierarchy or parent, lat, lng) and 'row_count'.
+    """
+    with get_connection() as conn:
+        rows = _box_query(conn.cursor(), kind, (min_lat, min_lng, max_lat, max_lng), min_grade, max_grade, limit)
+    return {"results": compact_rows(rows), "row_count": len(rows)}
+
+
+def _read_only_authorizer(action, arg1, arg2, db_name, trigger):
+    if action in _READ_ACTIONS:
+        return sqlite3.SQLITE_OK
+    # FTS5 issues these internally when it opens name_index; the connection is
+    # mode=ro + query_only anyway, so nothing can actually be written
+    if (action, arg1) in ((sqlite3.SQLITE_PRAGMA, "data_version"), (sqlite3.SQLITE_UPDATE, "sqlite_master")):
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+def _check_plan(conn: sqlite3.Connection, sql_query: str):
+    """Raises ValueError if the query plan fully scans a table above FULL_SCAN_ROW_LIMIT."""
+    tables = {r[0].lower() for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    # EXPLAIN QUERY PLAN reports aliases ('SCAN b'), so map them back to table names
+    aliases = {}
+    for table, alias in re.findall(r'(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?(\w+))?', sql_query, re.IGNORECASE):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.upper() not in ("WHERE", "JOIN", "ON", "GROUP", "ORDER", "LIMIT", "INNER",
+                                           "LEFT", "CROSS", "NATURAL", "USING", "UNION", "HAVING"):
+            aliases[alias.lower()] = table.lower()
+
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql_query}"):
+        match = re.match(r"SCAN (\w+)", row[3])
+        if not match or "VIRTUAL TABLE" in row[3]:
+            continue
+        table = aliases.get(match.group(1).lower(), match.group(1).lower())
+        if table not in tables:
+            continue
+        size = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        if size > FULL_SCAN_ROW_LIMIT:
+            raise ValueError(
+                f"Query rejected: it scans all ~{size} rows of '{table}'. "
+                "Filter on indexed columns or use get_coordinates instead."
+            )
+
+
+def iter_sql_query(sql_query: str, time_budget: float = SQL_TIME_BUDGET):
+    """
+    Runs a read-only query and yields rows as dicts, fetching SQL_FETCH_SIZE at a time.
+
+    The connection only allows reads (authorizer), the plan is checked for large full
+    scans up front, and a progress handler aborts the query once time_budget seconds
+    have passed. Raises sqlite3.Error or ValueError when a guardrail trips.
+    """
+    with get_connection() as conn:
+        deadline = time.monotonic() + time_budget
+        conn.set_authorizer(_read_only_authorizer)
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+        try:
+            _check_plan(conn, sql_query)
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            try:
+                with span("run_sql_query", "sql", sql=" ".join(sql_query.split())[:200]) as record:
+                    record["rows"] = 0
+                    cursor.execute(sql_query)
+                    while rows := cursor.fetchmany(SQL_FETCH_SIZE):
+                        record["rows"] += len(rows)
+                        for row in rows:
+                            yield dict(row)
+            except sqlite3.OperationalError as e:
+                if time.monotonic() > deadline:
+                    raise sqlite3.OperationalError(
+                        f"Query exceeded the {time_budget}s time budget. Add filters or a LIMIT."
+                    ) from e
+                raise
+            finally:
+                cursor.close()
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.set_authorizer(None)
+
+
+def run_sql_query(sql_query: str | None = None, cursor: str | None = None) -> dict:
     """
     Executes a read-only SQL query against the boulders database.
-    The database has two tables:
+    The database has these tables:
     1. 'areas': Use this for general location lookups (e.g., Powerlinez, Gunks, Peterskill).
        Columns: uuid, name, lat, lng, parent_name
     2. 'boulders': Use this for specific route info (grades, specific climb names).
-       Columns: uuid, area, sub_area, crag, rock, name, grade, lat, lng
+       Columns: uuid, area, sub_area, crag, rock, name, grade, grade_num, lat, lng
+       'grade_num' is the grade as a number (V3 = 3, V3+ = 3.5, V3-4 = 3.5, VB = -1,
+       NULL if ungraded) and is indexed as (area, sub_area, grade_num). Use it for
+       grade ranges and sorting with exact area and sub_area values (LIKE can't use
+       the index): WHERE area = 'Gunks' AND sub_area = 'Peterskill Bouldering'
+       AND grade_num BETWEEN 3 AND 5 ORDER BY grade_num.
+       normalize_grade('V4+') is available as an SQL function.
+    3. 'boulder_counts': Precomputed counts for "how many" questions.
+       Columns: area, sub_area, crag, rock, grade_bucket, boulders, with_gps
+       'grade_bucket' is the number on the grade (V3- to V3-4 are 3, VB = -1, NULL if
+       ungraded); SUM(boulders) over the matching rows. The views 'grade_histogram'
+       (area, sub_area, grade_bucket, boulders) and 'gps_coverage' (area, sub_area,
+       boulders, with_gps, missing_gps) roll it up per sub-area.
+
+    Only SELECT statements are allowed. Queries are stopped after a short time budget
+    and queries that would scan a very large table are rejected. Results come back
+    50 rows at a time; when there are more, call again with only the returned
+    'next_cursor' to get the next page. Every page re-runs the query, so prefer a
+    tighter WHERE or LIMIT over paging deep into a large result.
 
     Args:
         sql_query (str): A valid SQLite SELECT statement.
+        cursor (str, optional): The 'next_cursor' from a previous call, to continue it.
     
     Returns:
-        list: A list of dictionaries representing the rows from the database.
-              Returns a list containing a dictionary with an "error" key if an exception occurs.
+        dict: 'columns' and 'rows' (each row is a list of values in column order;
+              'constants' holds columns with the same value in every row and "^" means
+              "same as the row above"), 'row_count', 'offset', and 'next_cursor' if more
+              rows matched. Returns a dictionary with an "error" key if the query fails
+              or is rejected.
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row 
-    cursor = conn.cursor()
+    offset = 0
+    version = data_version()
+    if cursor:
+        page = _cursors.get(cursor)
+        if page is None:
+            return {"error": "Cursor expired or unknown. Run the query again."}
+        if page["version"] != version:
+            # Rows may have shifted between pages, so skipping ahead would be wrong
+            return {"error": "The database changed since the first page. Run the query again."}
+        sql_query, offset = page["sql"], page["offset"]
+    if not sql_query:
+        return {"error": "Provide sql_query (or a cursor from a previous call)."}
+
+    rows = []
+    more = False
     try:
-        cursor.execute(sql_query)
-        return [dict(row) for row in cursor.fetchall()]
-    except sqlite3.Error as e:
-        return [{"error": str(e)}]
-    finally:
-        conn.close()
\ No newline at end of file
+        with closing(iter_sql_query(sql_query)) as results:
+            # Pages re-run the query and skip ahead; the time budget still applies
+            for row in itertools.islice(results, offset, None):
+                if len(rows) == SQL_PAGE_ROWS:
+                    more = True
+                    break
+                rows.append(row)
+    except (sqlite3.Error, ValueError) as e:
+        return {"error": str(e)}
+
+    result = {**compact_rows(rows), "row_count": len(rows), "offset": offset}
+    if more:
+        token = secrets.token_urlsafe(8)
+        _cursors.set(token, {"sql": sql_query, "offset": offset + len(rows), "version": version}, CURSOR_TTL)
+        result["next_cursor"] = token
+    return result
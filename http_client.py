@@ -0,0 +1,64 @@
+import threading
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from tracing import span
+
+# (connect, read) seconds for a single attempt. Retries multiply this, so callers
+# that need a hard ceiling should also bound the overall wait (see weather_tool).
+TIMEOUT = (3.05, 10)
+RETRIES = 2
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide HTTP session.
+
+    The session keeps connections alive between calls (one pool per host) and
+    retries connection errors, 429s and 5xx responses with exponential backoff.
+    It is safe to share across Streamlit sessions and worker threads.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=RETRIES,
+                    backoff_factor=BACKOFF_FACTOR,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    # OpenBeta queries are POSTed but are read-only, so retrying them is safe
+                    allowed_methods=frozenset(["GET", "POST"]),
+                    respect_retry_after_header=True,
+                )
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_json(url: str, params: dict | None = None, timeout=TIMEOUT):
+    """GETs url and returns the decoded JSON body. Raises requests.RequestException on failure."""
+    with span(f"GET {urlparse(url).netloc}", "http") as record:
+        response = get_session().get(url, params=params, timeout=timeout)
+        record["status"] = response.status_code
+        record["response_bytes"] = len(response.content)
+        response.raise_for_status()
+        return response.json()
+
+
+def post_json(url: str, payload: dict, timeout=TIMEOUT):
+    """POSTs a JSON payload and returns the decoded JSON body. Raises requests.RequestException on failure."""
+    with span(f"POST {urlparse(url).netloc}", "http") as record:
+        response = get_session().post(url, json=payload, timeout=timeout)
+        record["status"] = response.status_code
+        record["response_bytes"] = len(response.content)
+        response.raise_for_status()
+        return response.json()
@@ -1,8 +1,20 @@
+import argparse
+import hashlib
+import json
+import os
 import sqlite3
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from db_tool import fold_name, normalize_grade, register_functions
+from http_client import post_json
 
 # The endpoint and query we've built
-URL = "https://api.openbeta.io"
+URL = os.environ.get("OPENBETA_URL", "https://api.openbeta.io")
+# OpenBeta is a shared public API, keep the fan-out modest
+INGEST_WORKERS = 8
+# Nodes fetched and written per transaction
+BATCH_NODES = 64
 QUERY = """
 query GetArea($id: ID!) {
   area(uuid: $id) {
@@ -20,29 +32,203 @@ query GetArea($id: ID!) {
 }
 """
 
-def ingest_node(area_id: str, levels: list[str], conn: sqlite3.Connection, p_lat: float = None, p_lng: float = None):
-    response = requests.post(URL, json={'query': QUERY, 'variables': {'id': area_id}})
-    data = response.json().get('data', {}).get('area', {})
-    if not data:
-        print(f"No data found for ID: {area_id}")
-        return
+# Columns boulder_counts groups on, and the grade bucket of a boulders row ({row} is
+# new/old in triggers). The bucket is the number on the grade, so V3-, V3, V3+ and
+# V3-4 all count as V3; VB is -1 and ungraded climbs are NULL.
+COUNT_GROUP = ("area", "sub_area", "crag", "rock")
+GRADE_BUCKET_SQL = ("CASE WHEN {row}.grade_num IS NULL THEN NULL WHEN {row}.grade_num = -1 THEN -1 "
+                    "ELSE CAST(substr({row}.grade, 2) AS INTEGER) END")
 
+
+def _count_sql(row: str, delta: int) -> str:
+    """Trigger statements that add delta to the boulder_counts group of row (new or old)."""
+    bucket = GRADE_BUCKET_SQL.format(row=row)
+    # IS rather than = so NULL levels (no rock, ungraded) still match their group
+    match = " AND ".join([f"{c} IS {row}.{c}" for c in COUNT_GROUP] + [f"grade_bucket IS {bucket}"])
+    gps = f"({row}.lat IS NOT NULL AND {row}.lng IS NOT NULL)"
+    statements = []
+    if delta > 0:
+        statements.append(f"""INSERT INTO boulder_counts ({", ".join(COUNT_GROUP)}, grade_bucket, boulders, with_gps)
+                              SELECT {", ".join(f"{row}.{c}" for c in COUNT_GROUP)}, {bucket}, 0, 0
+                              WHERE NOT EXISTS (SELECT 1 FROM boulder_counts WHERE {match});""")
+    statements.append(f"UPDATE boulder_counts SET boulders = boulders + {delta}, "
+                      f"with_gps = with_gps + {delta} * {gps} WHERE {match};")
+    if delta < 0:
+        statements.append(f"DELETE FROM boulder_counts WHERE boulders <= 0 AND {match};")
+    return "\n".join(statements)
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, decl: str) -> bool:
+    """Adds a column to databases built before it existed. Returns True if it was added."""
+    columns = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+    if column in columns:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+
+def create_schema(conn: sqlite3.Connection):
+    register_functions(conn)
+    conn.execute('''CREATE TABLE IF NOT EXISTS areas 
+                   (uuid TEXT PRIMARY KEY, name TEXT, lat REAL, lng REAL, parent_name TEXT,
+                    parent_uuid TEXT, content_hash TEXT, synced_at TEXT)''')
+    
+    conn.execute('''CREATE TABLE IF NOT EXISTS boulders 
+                   (uuid TEXT PRIMARY KEY, area TEXT, sub_area TEXT, crag TEXT, 
+                    rock TEXT, name TEXT, grade TEXT, description TEXT, 
+                    lat REAL, lng REAL, grade_num REAL, area_uuid TEXT)''')
+
+    if _add_column(conn, "boulders", "grade_num", "REAL"):
+        conn.execute("UPDATE boulders SET grade_num = normalize_grade(grade)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_boulders_area_grade ON boulders (area, sub_area, grade_num)")
+
+    # Sync bookkeeping: which area each row came from and what it looked like last time.
+    # Rows from before these columns existed are filled in by the first sync.
+    _add_column(conn, "areas", "parent_uuid", "TEXT")
+    _add_column(conn, "areas", "content_hash", "TEXT")
+    _add_column(conn, "areas", "synced_at", "TEXT")
+    _add_column(conn, "boulders", "area_uuid", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_areas_parent ON areas (parent_uuid)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_boulders_area_uuid ON boulders (area_uuid)")
+    # Climbs ingested before area_uuid existed can't be tombstoned until they have one.
+    # Their area is the one named after their deepest level, under the level above it;
+    # names that fit more than one area stay NULL until a sync rewrites them.
+    conn.execute('''UPDATE boulders SET area_uuid = (
+                       SELECT CASE WHEN COUNT(*) = 1 THEN MIN(a.uuid) END FROM areas a
+                       WHERE a.name = COALESCE(boulders.rock, boulders.crag, boulders.sub_area, boulders.area)
+                         AND a.parent_name IS CASE WHEN boulders.rock IS NOT NULL THEN boulders.crag
+                                                   WHEN boulders.crag IS NOT NULL THEN boulders.sub_area
+                                                   WHEN boulders.sub_area IS NOT NULL THEN boulders.area END)
+                   WHERE area_uuid IS NULL''')
+    # Climbs and areas that disappeared from OpenBeta
+    conn.execute('''CREATE TABLE IF NOT EXISTS tombstones
+                   (uuid TEXT PRIMARY KEY, kind TEXT, name TEXT, deleted_at TEXT)''')
+
+    # R*Tree indexes for proximity search, kept in step with the base tables by triggers.
+    # R*Tree ids must be integers, so they point at the base table's rowid.
+    for table in ("areas", "boulders"):
+        conn.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS {table}_rtree USING rtree
+                       (id, min_lat, max_lat, min_lng, max_lng)''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_rtree_insert AFTER INSERT ON {table}
+                       WHEN new.lat IS NOT NULL AND new.lng IS NOT NULL BEGIN
+                           INSERT OR REPLACE INTO {table}_rtree VALUES (new.rowid, new.lat, new.lat, new.lng, new.lng);
+                       END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_rtree_update AFTER UPDATE OF lat, lng ON {table} BEGIN
+                           DELETE FROM {table}_rtree WHERE id = old.rowid;
+                           INSERT INTO {table}_rtree SELECT new.rowid, new.lat, new.lat, new.lng, new.lng
+                               WHERE new.lat IS NOT NULL AND new.lng IS NOT NULL;
+                       END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_rtree_delete AFTER DELETE ON {table} BEGIN
+                           DELETE FROM {table}_rtree WHERE id = old.rowid;
+                       END''')
+        if conn.execute(f"SELECT COUNT(*) FROM {table}_rtree").fetchone()[0] == 0:
+            conn.execute(f'''INSERT INTO {table}_rtree SELECT rowid, lat, lat, lng, lng FROM {table}
+                           WHERE lat IS NOT NULL AND lng IS NOT NULL''')
+
+    # Boulder counts per area/sub_area/crag/rock and grade bucket, kept in step with
+    # boulders by triggers so count and distribution questions don't GROUP BY the
+    # whole table. The views roll them up further.
+    conn.execute('''CREATE TABLE IF NOT EXISTS boulder_counts
+                   (area TEXT, sub_area TEXT, crag TEXT, rock TEXT, grade_bucket INTEGER,
+                    boulders INTEGER, with_gps INTEGER)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_boulder_counts_group "
+                 "ON boulder_counts (area, sub_area, crag, rock, grade_bucket)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_boulder_counts_crag ON boulder_counts (crag)")
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS boulder_counts_insert AFTER INSERT ON boulders BEGIN
+                       {_count_sql("new", 1)}
+                   END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS boulder_counts_update
+                   AFTER UPDATE OF area, sub_area, crag, rock, grade, grade_num, lat, lng ON boulders
+                   WHEN {" OR ".join(f"old.{c} IS NOT new.{c}" for c in COUNT_GROUP + ("grade", "grade_num"))}
+                        OR (old.lat IS NULL OR old.lng IS NULL) IS NOT (new.lat IS NULL OR new.lng IS NULL) BEGIN
+                       {_count_sql("old", -1)}
+                       {_count_sql("new", 1)}
+                   END''')
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS boulder_counts_delete AFTER DELETE ON boulders BEGIN
+                       {_count_sql("old", -1)}
+                   END''')
+    if conn.execute("SELECT COUNT(*) FROM boulder_counts").fetchone()[0] == 0:
+        conn.execute(f'''INSERT INTO boulder_counts ({", ".join(COUNT_GROUP)}, grade_bucket, boulders, with_gps)
+                       SELECT {", ".join(COUNT_GROUP)}, {GRADE_BUCKET_SQL.format(row="boulders")}, COUNT(*),
+                              SUM(lat IS NOT NULL AND lng IS NOT NULL)
+                       FROM boulders GROUP BY 1, 2, 3, 4, 5''')
+    conn.execute('''CREATE VIEW IF NOT EXISTS grade_histogram AS
+                   SELECT area, sub_area, grade_bucket, SUM(boulders) AS boulders
+                   FROM boulder_counts GROUP BY area, sub_area, grade_bucket''')
+    conn.execute('''CREATE VIEW IF NOT EXISTS gps_coverage AS
+                   SELECT area, sub_area, SUM(boulders) AS boulders, SUM(with_gps) AS with_gps,
+                          SUM(boulders) - SUM(with_gps) AS missing_gps
+                   FROM boulder_counts GROUP BY area, sub_area''')
+
+    # Checkpoint for ingest(): nodes still to be fetched, with the hierarchy and GPS they inherit
+    conn.execute('''CREATE TABLE IF NOT EXISTS ingest_queue
+                   (uuid TEXT PRIMARY KEY, levels TEXT, lat REAL, lng REAL, parent_uuid TEXT)''')
+    _add_column(conn, "ingest_queue", "parent_uuid", "TEXT")
+
+    # Trigram index over folded (lowercase, accent-free) names for get_coordinates.
+    # 'context' holds the hierarchy: parent_name for areas, area..rock for boulders.
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS name_index USING fts5
+                   (name, context, kind UNINDEXED, uuid UNINDEXED, tokenize='trigram')''')
+    # FTS5 can't look rows up by an UNINDEXED column, so index_names finds the rows
+    # to replace through this uuid -> name_index rowid map instead of a full scan
+    conn.execute('''CREATE TABLE IF NOT EXISTS name_index_rowids
+                   (uuid TEXT PRIMARY KEY, id INTEGER) WITHOUT ROWID''')
+    if conn.execute("SELECT COUNT(*) FROM name_index_rowids").fetchone()[0] == 0:
+        conn.execute("INSERT OR REPLACE INTO name_index_rowids (uuid, id) SELECT uuid, rowid FROM name_index")
+
+
+def index_names(conn: sqlite3.Connection, uuids: list[str] | None = None):
+    """
+    Rebuilds name_index rows from areas and boulders.
+
+    Pass uuids to refresh only those rows (e.g. after an incremental sync),
+    or leave it as None to rebuild the whole index.
+    """
+    if uuids is None:
+        conn.execute("DELETE FROM name_index")
+        conn.execute("DELETE FROM name_index_rowids")
+        area_rows = conn.execute("SELECT uuid, name, parent_name FROM areas").fetchall()
+        boulder_rows = conn.execute("SELECT uuid, name, area, sub_area, crag, rock FROM boulders").fetchall()
+    else:
+        area_rows, boulder_rows = [], []
+        for i in range(0, len(uuids), 500):
+            chunk = uuids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM name_index WHERE rowid IN "
+                         f"(SELECT id FROM name_index_rowids WHERE uuid IN ({marks}))", chunk)
+            conn.execute(f"DELETE FROM name_index_rowids WHERE uuid IN ({marks})", chunk)
+            area_rows += conn.execute(
+                f"SELECT uuid, name, parent_name FROM areas WHERE uuid IN ({marks})", chunk).fetchall()
+            boulder_rows += conn.execute(
+                f"SELECT uuid, name, area, sub_area, crag, rock FROM boulders WHERE uuid IN ({marks})", chunk).fetchall()
+
+    rows = [(fold_name(r[1]), fold_name(r[2]), "area", r[0]) for r in area_rows]
+    rows += [(fold_name(r[1]), fold_name(" > ".join(filter(None, r[2:]))), "boulder", r[0]) for r in boulder_rows]
+    # Explicit rowids so the map can be written in bulk
+    first = (conn.execute("SELECT MAX(rowid) FROM name_index").fetchone()[0] or 0) + 1
+    rows = [(first + i, *row) for i, row in enumerate(rows)]
+    conn.executemany("INSERT INTO name_index (rowid, name, context, kind, uuid) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.executemany("INSERT OR REPLACE INTO name_index_rowids (uuid, id) VALUES (?, ?)",
+                     [(row[4], row[0]) for row in rows])
+
+
+def parse_node(area_id: str, levels: list[str], data: dict, p_lat: float = None, p_lng: float = None,
+               parent_uuid: str | None = None):
+    """
+    Turns one OpenBeta area payload into rows.
+
+    Returns (area_row, climb_rows, children), where children are
+    (uuid, levels, lat, lng, parent_uuid) tuples ready to be queued.
+    """
     # Use this level's GPS, or fall back to parent's
-    metadata = data.get('metadata', {})
+    metadata = data.get('metadata') or {}
     current_lat = metadata.get('lat') if metadata.get('lat') else p_lat
     current_lng = metadata.get('lng') if metadata.get('lng') else p_lng
 
     current_name = data['areaName']
     current_levels = levels + [current_name]
-    
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT OR IGNORE INTO areas (uuid, name, lat, lng, parent_name)
-        VALUES (?, ?, ?, ?, ?)""", 
-        (area_id, current_name, current_lat, current_lng, levels[-1] if levels else None)
-    )
 
+    climb_rows = []
     for climb in data.get('climbs', []):
         if climb['type']['bouldering']:
             grade = climb['grades']['vscale']
@@ -50,7 +236,7 @@ def ingest_node(area_id: str, levels: list[str], conn: sqlite3.Connection, p_lat
                 grade = "V?"
             # Hierarchy mapping: [Area, SubArea, Crag, Rock]
             h = current_levels
-            row = (
+            climb_rows.append((
                 climb['uuid'],
                 h[0] if len(h) > 0 else None, # Area
                 h[1] if len(h) > 1 else None, # Sub Area
@@ -58,30 +244,220 @@ def ingest_node(area_id: str, levels: list[str], conn: sqlite3.Connection, p_lat
                 h[3] if len(h) > 3 else None, # Rock
                 climb['name'],
                 grade,
-                current_lat, current_lng
+                normalize_grade(grade),
+                current_lat, current_lng,
+                area_id
+            ))
+
+    # Keep going down into Crags and Rocks
+    children = [(child['uuid'], current_levels, current_lat, current_lng, area_id)
+                for child in data.get('children', [])]
+
+    # Everything this node's rows are derived from, including what it inherits
+    content_hash = hashlib.sha1(json.dumps(
+        [levels, current_name, current_lat, current_lng, climb_rows, sorted(c[0] for c in children)]
+    ).encode()).hexdigest()
+
+    area_row = (area_id, current_name, current_lat, current_lng, levels[-1] if levels else None,
+                parent_uuid, content_hash)
+    return area_row, climb_rows, children
+
+
+def fetch_node(area_id: str, url: str = URL) -> dict | None:
+    # http_client retries transient failures with backoff before this raises
+    response = post_json(url, {'query': QUERY, 'variables': {'id': area_id}})
+    return (response.get('data') or {}).get('area')
+
+
+def _select_in(conn: sqlite3.Connection, sql: str, values: list) -> list:
+    """Runs sql (containing a single {marks} placeholder list) over values in chunks."""
+    rows = []
+    for i in range(0, len(values), 500):
+        chunk = values[i:i + 500]
+        rows += conn.execute(sql.format(marks=",".join("?" * len(chunk))), chunk).fetchall()
+    return rows
+
+
+def _tombstone(conn: sqlite3.Connection, area_rows: list, listed_climbs: list[str], children: list,
+               now: str) -> list[str]:
+    """
+    Deletes climbs and child areas that the changed areas no longer list.
+
+    Removed child areas take their whole subtree with them (anything that merely moved
+    is re-inserted when its new parent's round gets to it). Every deleted row gets a
+    tombstones entry. Returns the deleted uuids.
+    """
+    area_ids = [row[0] for row in area_rows]
+    listed_climbs = set(listed_climbs)
+    listed_children = {child[0] for child in children}
+
+    gone_areas = [r for r in _select_in(conn, "SELECT uuid, name FROM areas WHERE parent_uuid IN ({marks})", area_ids)
+                  if r[0] not in listed_children]
+    if gone_areas:
+        # Pull in the whole subtree under each removed area
+        gone_areas = _select_in(conn, """
+            WITH RECURSIVE subtree(uuid) AS (
+                SELECT uuid FROM areas WHERE uuid IN ({marks})
+                UNION SELECT a.uuid FROM areas a JOIN subtree s ON a.parent_uuid = s.uuid
             )
-            cursor.execute("""
-                INSERT OR IGNORE INTO boulders 
-                (uuid, area, sub_area, crag, rock, name, grade, lat, lng) 
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", row)
-    
+            SELECT uuid, name FROM areas WHERE uuid IN (SELECT uuid FROM subtree)""", [r[0] for r in gone_areas])
+
+    gone_climbs = [r for r in _select_in(conn, "SELECT uuid, name FROM boulders WHERE area_uuid IN ({marks})",
+                                         area_ids + [r[0] for r in gone_areas])
+                   if r[0] not in listed_climbs]
+
+    conn.executemany("DELETE FROM boulders WHERE uuid = ?", [(r[0],) for r in gone_climbs])
+    conn.executemany("DELETE FROM areas WHERE uuid = ?", [(r[0],) for r in gone_areas])
+    conn.executemany("INSERT OR REPLACE INTO tombstones (uuid, kind, name, deleted_at) VALUES (?, ?, ?, ?)",
+                     [(r[0], "boulder", r[1], now) for r in gone_climbs] +
+                     [(r[0], "area", r[1], now) for r in gone_areas])
+    return [r[0] for r in gone_climbs + gone_areas]
+
+
+def _write_round(conn: sqlite3.Connection, area_rows: list, climb_rows: list, children: list,
+                 sync: bool, now: str) -> dict:
+    """
+    Upserts one round of areas and climbs and returns what changed.
+
+    In sync mode, areas whose content_hash matches the stored one are skipped
+    entirely, and climbs/areas they no longer list are tombstoned.
+    """
+    if sync:
+        stored = dict(_select_in(conn, "SELECT uuid, content_hash FROM areas WHERE uuid IN ({marks})",
+                                 [row[0] for row in area_rows]))
+        area_rows = [row for row in area_rows if stored.get(row[0]) != row[-1]]
+        changed_ids = {row[0] for row in area_rows}
+        climb_rows = [row for row in climb_rows if row[-1] in changed_ids]
+        children = [child for child in children if child[-1] in changed_ids]
+    listed_climbs = [row[0] for row in climb_rows]
+
+    # Only write climbs that are new or differ from what's stored, so derived
+    # structures (R*Tree triggers, name_index) only see real changes
+    existing = {r[0]: tuple(r) for r in _select_in(conn, """
+        SELECT uuid, area, sub_area, crag, rock, name, grade, grade_num, lat, lng, area_uuid
+        FROM boulders WHERE uuid IN ({marks})""", [row[0] for row in climb_rows])}
+    climb_rows = [row for row in climb_rows if existing.get(row[0]) != tuple(row)]
+
+    conn.executemany("""
+        INSERT INTO areas (uuid, name, lat, lng, parent_name, parent_uuid, content_hash, synced_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (uuid) DO UPDATE SET
+            name = excluded.name, lat = excluded.lat, lng = excluded.lng,
+            parent_name = excluded.parent_name, parent_uuid = excluded.parent_uuid,
+            content_hash = excluded.content_hash, synced_at = excluded.synced_at""",
+        [row + (now,) for row in area_rows])
+    conn.executemany("""
+        INSERT INTO boulders 
+        (uuid, area, sub_area, crag, rock, name, grade, grade_num, lat, lng, area_uuid) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (uuid) DO UPDATE SET
+            area = excluded.area, sub_area = excluded.sub_area, crag = excluded.crag,
+            rock = excluded.rock, name = excluded.name, grade = excluded.grade,
+            grade_num = excluded.grade_num, lat = excluded.lat, lng = excluded.lng,
+            area_uuid = excluded.area_uuid""", climb_rows)
+    # Something that moved may have been tombstoned by its old parent first
+    conn.executemany("DELETE FROM tombstones WHERE uuid = ?", [(row[0],) for row in area_rows + climb_rows])
+
+    deleted = _tombstone(conn, area_rows, listed_climbs, children, now) if sync and area_rows else []
+    # Index in the same transaction, so a run that dies later (and a resume, or a
+    # sync that then sees matching hashes) can't leave committed rows unindexed
+    index_names(conn, [row[0] for row in area_rows + climb_rows] + deleted)
+    return {
+        "changed_areas": [row[0] for row in area_rows],
+        "changed_climbs": [row[0] for row in climb_rows],
+        "deleted": deleted,
+    }
+
+
+def ingest(conn: sqlite3.Connection, roots: list[tuple], url: str = URL,
+           workers: int = INGEST_WORKERS, fresh: bool = False, sync: bool = False) -> dict:
+    """
+    Walks the OpenBeta area tree below each root and writes every area and boulder.
+
+    Pending nodes live in the ingest_queue table. Each round pulls up to BATCH_NODES of
+    them, fetches them concurrently on `workers` threads, then writes their rows, queues
+    their children and removes them from the queue in a single transaction. If the run
+    dies, the next call picks up from the queue instead of starting over (pass
+    fresh=True to discard it).
+
+    Rows are upserted, so refreshed names, grades and coordinates land, and their
+    name_index entries are rewritten in the same transaction. With sync=True,
+    areas whose content hash is unchanged are not rewritten, and climbs or sub-areas
+    that vanished upstream are deleted and recorded in 'tombstones'. Every node is still
+    fetched: OpenBeta doesn't expose a subtree-level change marker, so an unchanged area
+    can still have changed descendants.
+
+    Args:
+        conn: Writable connection to routes.db (create_schema already applied).
+        roots: (uuid, starting hierarchy list) pairs.
+        url: GraphQL endpoint, e.g. a local stand-in server for testing.
+        workers: Maximum number of concurrent requests.
+        fresh: Drop any checkpoint left by an earlier run.
+        sync: Incremental mode (skip unchanged areas, tombstone deletions).
+
+    Returns:
+        dict: 'nodes', 'climbs', 'seconds', 'nodes_per_sec', plus 'changed_areas',
+              'changed_climbs' and 'deleted' uuid lists for updating derived structures.
+    """
+    if fresh:
+        conn.execute("DELETE FROM ingest_queue")
+    if conn.execute("SELECT COUNT(*) FROM ingest_queue").fetchone()[0] == 0:
+        conn.executemany("INSERT OR IGNORE INTO ingest_queue (uuid, levels) VALUES (?, ?)",
+                         [(uuid, json.dumps(path)) for uuid, path in roots])
+    else:
+        print("--- Resuming from checkpoint ---")
     conn.commit()
-    print(f"Processed: {' > '.join(current_levels)}")
 
-    # Keep going down into Crags and Rocks
-    for child in data.get('children', []):
-        ingest_node(child['uuid'], current_levels, conn, current_lat, current_lng)
+    nodes = climbs = 0
+    changes = {"changed_areas": [], "changed_climbs": [], "deleted": []}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending := conn.execute(
+                "SELECT uuid, levels, lat, lng, parent_uuid FROM ingest_queue LIMIT ?", (BATCH_NODES,)).fetchall():
+            fetched = list(pool.map(lambda node: fetch_node(node[0], url), pending))
+
+            area_rows, climb_rows, children = [], [], []
+            for (area_id, levels, p_lat, p_lng, parent_uuid), data in zip(pending, fetched):
+                if not data:
+                    print(f"No data found for ID: {area_id}")
+                    continue
+                area_row, node_climbs, node_children = parse_node(
+                    area_id, json.loads(levels), data, p_lat, p_lng, parent_uuid)
+                area_rows.append(area_row)
+                climb_rows += node_climbs
+                children += node_children
+                print(f"Processed: {' > '.join(json.loads(levels) + [area_row[1]])}")
+
+            now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO ingest_queue (uuid, levels, lat, lng, parent_uuid) VALUES (?, ?, ?, ?, ?)",
+                    [(uuid, json.dumps(levels), lat, lng, parent) for uuid, levels, lat, lng, parent in children])
+                conn.executemany("DELETE FROM ingest_queue WHERE uuid = ?", [(node[0],) for node in pending])
+                round_changes = _write_round(conn, area_rows, climb_rows, children, sync, now)
+
+            for key, uuids in round_changes.items():
+                changes[key] += uuids
+            nodes += len(pending)
+            climbs += len(climb_rows)
+
+    seconds = time.perf_counter() - started
+    return {"nodes": nodes, "climbs": climbs, "seconds": round(seconds, 2),
+            "nodes_per_sec": round(nodes / seconds, 1) if seconds else 0.0, **changes}
+
 
 if __name__ == "__main__":
-    conn = sqlite3.connect('data/routes.db')
+    parser = argparse.ArgumentParser(description="Ingest OpenBeta bouldering data into routes.db")
+    parser.add_argument("--db", default="data/routes.db")
+    parser.add_argument("--url", default=URL, help="GraphQL endpoint (point at a local stand-in to test, see benchmark.start_openbeta_stub)")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--fresh", action="store_true", help="Ignore any checkpoint from an interrupted run")
+    parser.add_argument("--sync", action="store_true",
+                        help="Incremental refresh: only rewrite changed areas and tombstone deleted climbs")
+    args = parser.parse_args()
 
-    conn.execute('''CREATE TABLE IF NOT EXISTS areas 
-                   (uuid TEXT PRIMARY KEY, name TEXT, lat REAL, lng REAL, parent_name TEXT)''')
-    
-    conn.execute('''CREATE TABLE IF NOT EXISTS boulders 
-                   (uuid TEXT PRIMARY KEY, area TEXT, sub_area TEXT, crag TEXT, 
-                    rock TEXT, name TEXT, grade TEXT, description TEXT, 
-                    lat REAL, lng REAL)''')
+    conn = sqlite3.connect(args.db)
+    create_schema(conn)
 
     # Format: (Target UUID, Starting Hierarchy List)
     locations = [
@@ -91,9 +467,14 @@ if __name__ == "__main__":
         ("150dc369-9adc-5633-b3ab-39d2a291d503", ["Gunks"])  # Peterskill Bouldering
     ]
 
-    for uuid, path in locations:
-        print(f"--- Starting Ingestion for {path[-1]} ---")
-        ingest_node(uuid, path, conn)
+    print(f"--- Starting Ingestion for {', '.join(path[-1] for _, path in locations)} ---")
+    stats = ingest(conn, locations, url=args.url, workers=args.workers, fresh=args.fresh, sync=args.sync)
 
+    # name_index is kept up to date round by round inside ingest()
+    conn.commit()
     conn.close()
-    print("--- All Database Populations Complete ---")
\ No newline at end of file
+    print(f"--- All Database Populations Complete: {stats['nodes']} nodes, {stats['climbs']} climbs "
+          f"in {stats['seconds']}s ({stats['nodes_per_sec']} nodes/s) ---")
+    if args.sync:
+        print(f"--- Sync: {len(stats['changed_areas'])} areas and {len(stats['changed_climbs'])} climbs changed, "
+              f"{len(stats['deleted'])} tombstoned ---")
@@ -0,0 +1,184 @@
+import re
+import threading
+import time
+from datetime import date, timedelta
+
+from db_tool import find_names, name_alias
+from tracing import span, traced_tool
+from weather_tool import get_bouldering_weather
+
+# Phrasings we answer without the model. Anything that doesn't match one of these
+# exactly (other dates, comparisons, follow-ups) goes to the agent.
+_DAY = r"(?:\s+(?P<day>today|tomorrow))?"
+_END = r"\s*[?.!]*$"
+CONDITIONS_PATTERNS = [
+    re.compile(r"^(?:how(?:'s| is| are)|what(?:'s| is| are))?\s*(?:the\s+)?(?:weather|conditions?)(?:\s+like)?"
+               r"\s+(?:at|in|for|on)\s+(?P<place>.+?)" + _DAY + _END, re.I),
+    re.compile(r"^(?:is|are)\s+(?:the\s+)?(?P<place>.+?)\s+(?:dry|in condition|climbable|good to climb)" + _DAY + _END, re.I),
+    re.compile(r"^(?:can i|should i|is it good to)\s+(?:climb|boulder|send)\s+(?:at\s+)?(?P<place>.+?)" + _DAY + _END, re.I),
+]
+GRADE_PATTERNS = [
+    re.compile(r"^(?:what(?:'s| is)\s+the\s+grade\s+(?:of|for)|what\s+grade\s+is|how\s+hard\s+is|grade\s+(?:of|for))"
+               r"\s+(?P<name>.+?)" + _END, re.I),
+]
+# Grade answers list at most this many same-named climbs before handing off to the agent.
+MAX_GRADE_MATCHES = 5
+
+# The router calls the same tools the agent would, so they show up in traces the same way.
+_get_bouldering_weather = traced_tool(get_bouldering_weather)
+
+_stats = {"hits": 0, "misses": 0, "hit_ms": 0.0, "miss_ms": 0.0, "intents": {}}
+_stats_lock = threading.Lock()
+
+
+def _clean(name: str) -> str:
+    return name.strip().strip("'\"“”‘’").strip()
+
+
+def _resolve_place(place: str) -> dict | None:
+    """
+    The one area (or, failing that, boulder) whose name is place, give or take the
+    decoration name_alias drops. None if there isn't exactly one.
+    """
+    alias = name_alias(place)
+    # Areas first, like get_coordinates. find_names also returns names that merely
+    # contain the query ("New York" finds "In a New York Minute"), so those don't count.
+    for kind in ("area", "boulder"):
+        matches = [m for m in find_names(alias, kind) if name_alias(m["name"]) == alias]
+        if matches:
+            if len(matches) == 1 and matches[0]["lat"] is not None and matches[0]["lng"] is not None:
+                return matches[0]
+            return None
+    return None
+
+
+def _resolve_climbs(name: str) -> list[dict] | None:
+    """Every climb called name (same-named climbs are all listed), or None if there are none or too many."""
+    # A name that only contains the query isn't a match
+    picked = [m for m in find_names(name, "boulder") if m["exact"]]
+    return picked if 0 < len(picked) <= MAX_GRADE_MATCHES else None
+
+
+def _conditions(place: str, day: str | None, match: dict) -> dict:
+    coords = {"lat": match["lat"], "lng": match["lng"]}
+    label = match["name"].lstrip("* ")
+
+    target = date.today() + timedelta(days=1 if day == "tomorrow" else 0)
+    report = _get_bouldering_weather(coords["lat"], coords["lng"], target.isoformat())
+    calls = [
+        {"function": "find_names", "args": {"location_name": name_alias(place), "kind": "area"}},
+        {"function": "get_bouldering_weather", "args": {**coords, "date_str": target.isoformat()}},
+    ]
+    when = "tomorrow" if target > date.today() else "today"
+    if "error" in report:
+        return {"intent": "conditions", "tool_calls": calls, "cacheable": False,
+                "answer": f"I couldn't get the weather for {label} {when}: {report['error']}"}
+
+    metrics = report["metrics"]
+    lines = [f"The conditions at {label} {when} are **{report['status']}**!"]
+    if metrics["temp_f"]:
+        lines.append(f"Daylight temps run {metrics['temp_f']}F ({metrics['daylight_window']})")
+        if metrics["max_humidity_pct"] is not None:
+            lines[-1] += f" with humidity up to {metrics['max_humidity_pct']}%"
+        lines[-1] += "."
+    if metrics["historical_rain_in"] is not None:
+        lines.append(f"{metrics['historical_rain_in']}\" of rain fell in the last 48h.")
+    lines.append(report["verdict"])
+    cacheable = not report.get("partial")
+    return {"intent": "conditions", "tool_calls": calls, "cacheable": cacheable, "answer": " ".join(lines)}
+
+
+def _grade(name: str, picked: list[dict]) -> dict:
+    calls = [{"function": "find_names", "args": {"location_name": name, "kind": "boulder"}}]
+    if len(picked) == 1:
+        m = picked[0]
+        return {"intent": "grade", "tool_calls": calls, "cacheable": True,
+                "answer": f"**{m['name']}** ({m['context']}) is graded **{m['grade'] or 'V?'}**."}
+    lines = [f"There are {len(picked)} climbs called {picked[0]['name']}:"]
+    lines += [f"- **{m['grade'] or 'V?'}** at {m['context']}" for m in picked]
+    return {"intent": "grade", "tool_calls": calls, "cacheable": True, "answer": "\n".join(lines)}
+
+
+def parse(prompt: str) -> dict | None:
+    """
+    Matches the prompt against the fast-path phrasings without touching the database.
+
+    Returns {'intent', 'name', 'day'} (day is 'today', 'tomorrow' or None), or None.
+    """
+    text = " ".join(prompt.split())
+    for pattern in CONDITIONS_PATTERNS:
+        m = pattern.match(text)
+        if m:
+            return {"intent": "conditions", "name": _clean(m["place"]), "day": (m["day"] or "today").lower()}
+    for pattern in GRADE_PATTERNS:
+        m = pattern.match(text)
+        if m:
+            return {"intent": "grade", "name": _clean(m["name"]), "day": None}
+    return None
+
+
+def resolve(prompt: str) -> dict | None:
+    """
+    parse() plus the database lookup: the parsed intent with its 'matches' (the place
+    or the climbs), or None if the prompt didn't parse or its name isn't one we know.
+
+    Pronouns and follow-ups ("is it dry today?", "what grade is it?") parse but don't
+    resolve, so callers can tell a real name from one that leans on the conversation.
+    """
+    parsed = parse(prompt)
+    if parsed is None:
+        return None
+    if parsed["intent"] == "conditions":
+        match = _resolve_place(parsed["name"])
+        matches = [match] if match else None
+    else:
+        matches = _resolve_climbs(parsed["name"])
+    return {**parsed, "matches": matches} if matches else None
+
+
+def route(prompt: str, resolved: dict | None = None) -> dict | None:
+    """
+    Answers the common intents straight from the tools, skipping the model.
+
+    Recognizes "conditions at <place> [today|tomorrow]" and "grade of <climb>" when the
+    name is in the database as asked ("Peterskill" for "Peterskill Bouldering" counts;
+    names that merely contain it, or a place name shared by several rows, go to the
+    agent). Returns a dict with 'intent', 'answer', the 'tool_calls' it made and whether
+    the answer is 'cacheable', or None when the prompt should go to the agent. Pass
+    resolved if the caller already ran resolve().
+    """
+    start = time.perf_counter()
+    result = None
+    with span("route", "router") as record:
+        resolved = resolved or resolve(prompt)
+        if resolved and resolved["intent"] == "conditions":
+            result = _conditions(resolved["name"], resolved["day"], resolved["matches"][0])
+        elif resolved:
+            result = _grade(resolved["name"], resolved["matches"])
+        record["intent"] = result["intent"] if result else None
+
+    elapsed = (time.perf_counter() - start) * 1000
+    with _stats_lock:
+        if result:
+            _stats["hits"] += 1
+            _stats["hit_ms"] += elapsed
+            _stats["intents"][result["intent"]] = _stats["intents"].get(result["intent"], 0) + 1
+        else:
+            _stats["misses"] += 1
+            _stats["miss_ms"] += elapsed
+    return result
+
+
+def router_stats() -> dict:
+    """Hit rate and mean latency of the fast path. Every hit is an agent run we skipped."""
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "mean_hit_ms": round(_stats["hit_ms"] / hits, 2) if hits else 0.0,
+            "mean_miss_ms": round(_stats["miss_ms"] / misses, 2) if misses else 0.0,
+            "intents": dict(_stats["intents"]),
+        }
@@ -0,0 +1,194 @@
+import warnings
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import requests
+
+from weather_tool import fetch_hourly, forecast_tool
+
+HOURLY_FIELDS = ["temperature_2m", "relative_humidity_2m", "precipitation", "weather_code", "is_day"]
+# Extra days fetched before today so the rolling rain total is right from the first hour
+LOOKBACK_DAYS = 2
+MIN_DAYS = 7
+MAX_DAYS = 14
+
+# Same thresholds as get_bouldering_weather's verdict
+SEND_TEMP_MIN_F = 35
+SEND_TEMP_MAX_F = 60
+# Temperature score fades to 0 this many degrees outside the send band
+TEMP_FALLOFF_F = 15
+HUMIDITY_OK_PCT = 60
+HUMIDITY_BAD_PCT = 95
+# 48h rain above this means seepage; any hour wetter than HOURLY_RAIN_IN is a washout
+WET_RAIN_IN = 0.15
+HOURLY_RAIN_IN = 0.02
+# WMO Codes 71-77: Snow | 85-86: Snow showers | 96-99: Hail/Thunderstorms
+HAZARD_CODES = [71, 73, 75, 77, 85, 86, 96, 99]
+# A send window is this many consecutive daylight hours
+SESSION_HOURS = 4
+GREEN_SCORE = 0.75
+YELLOW_SCORE = 0.4
+TOP_OPTIONS = 5
+
+
+def _stack(responses: list[dict], field: str, hours: int, offsets: list[int]) -> np.ndarray:
+    """
+    (locations, hours) float array of one hourly field, NaN where it is missing.
+    Row i starts offsets[i] hours into its response.
+    """
+    out = np.full((len(responses), hours), np.nan)
+    for i, (res, offset) in enumerate(zip(responses, offsets)):
+        values = np.array(res["hourly"].get(field, [])[offset:offset + hours], dtype=float)
+        out[i, :len(values)] = values
+    return out
+
+
+def score_hours(temp, humidity, precip, codes, is_day) -> tuple:
+    """
+    Scores every hour of every location from 0 (no-go) to 1 (prime), NaN at night.
+
+    All inputs are (locations, hours) arrays starting LOOKBACK_DAYS before the
+    first scored day. Returns (scores, rain over the previous 48 hours).
+    """
+    too_cold = SEND_TEMP_MIN_F - temp
+    too_hot = temp - SEND_TEMP_MAX_F
+    temp_score = np.clip(1 - np.maximum(np.maximum(too_cold, too_hot), 0) / TEMP_FALLOFF_F, 0, 1)
+    humidity_score = np.clip((HUMIDITY_BAD_PCT - humidity) / (HUMIDITY_BAD_PCT - HUMIDITY_OK_PCT), 0, 1)
+
+    rain = np.nan_to_num(precip)
+    totals = np.cumsum(rain, axis=1)
+    rain_48h = totals - np.pad(totals, ((0, 0), (48, 0)))[:, :-48]
+    dry_score = np.clip(1 - rain_48h / WET_RAIN_IN, 0, 1)
+    dry_score[rain > HOURLY_RAIN_IN] = 0
+    dry_score[np.isin(codes, HAZARD_CODES)] = 0
+
+    scores = temp_score * humidity_score * dry_score
+    scores[is_day != 1] = np.nan
+    return scores, rain_48h
+
+
+def _best_windows(scores: np.ndarray) -> tuple:
+    """Best SESSION_HOURS run per (location, day): (mean score, start hour), -inf where none fits."""
+    windows = np.lib.stride_tricks.sliding_window_view(scores, SESSION_HOURS, axis=2)
+    # A window touching a night (NaN) hour isn't a session
+    means = np.where(np.isnan(windows).any(axis=3), -np.inf, np.nan_to_num(windows).mean(axis=3))
+    start = means.argmax(axis=2)
+    best = np.take_along_axis(means, start[..., None], axis=2)[..., 0]
+    return best, start
+
+
+def _status(score: float) -> str:
+    if score >= GREEN_SCORE:
+        return "Green"
+    if score >= YELLOW_SCORE:
+        return "Yellow"
+    return "Red"
+
+
+@forecast_tool
+def plan_send_days(lats: list[float], lngs: list[float], names: list[str] | None = None, days: int = 7) -> dict:
+    """
+    Ranks the next 7-14 days at one or more crags and finds the best send window on each.
+
+    Use this for "when and where should I go this week?" style questions instead of
+    calling get_bouldering_weather once per crag and day. Every daylight hour is scored
+    on the send temperature band (35-60F), humidity, rain over the previous 48h and
+    snow/hail/storm hazards; a day's score is its best 4-hour window.
+
+    IMPORTANT: get_coordinates must be called first for every location.
+
+    Args:
+        lats (list[float]): Latitudes of the crags, in the same order as lngs.
+        lngs (list[float]): Longitudes of the crags, in the same order as lats.
+        names (list[str], optional): Labels for the crags, echoed back in the results.
+        days (int, optional): How many days ahead to plan, 7 to 14. Defaults to 7.
+
+    Returns:
+        dict: 'best' (the top crag/day/window options overall) and 'crags', each with
+              its 'days' ranked best first: 'date', 'score' (0-1), 'status', 'window',
+              'temp_f', 'max_humidity_pct', 'rain_48h_in' and 'hazard'; 'row_count' is
+              the number of crags.
+    """
+    if len(lats) != len(lngs):
+        return {"error": "lats and lngs must have the same length."}
+    if not lats:
+        return {"error": "Provide at least one location."}
+    if names and len(names) != len(lats):
+        return {"error": "names must have one entry per location."}
+    names = names or [None] * len(lats)
+    days = int(min(max(days, MIN_DAYS), MAX_DAYS))
+
+    today = date.today()
+    # Series are in each crag's local time, and its date can be a day either side of
+    # ours, so fetch a spare day at both ends and line each crag up on its own today
+    start = today - timedelta(days=LOOKBACK_DAYS + 1)
+    try:
+        responses = fetch_hourly(list(zip(lats, lngs)), start, today + timedelta(days=days), HOURLY_FIELDS)
+    except requests.HTTPError as e:
+        return {"error": f"Open-Meteo returned HTTP {e.response.status_code}."}
+    except (requests.RequestException, ValueError) as e:
+        return {"error": f"Open-Meteo request failed ({type(e).__name__})."}
+
+    ok = [i for i, res in enumerate(responses) if "hourly" in res]
+    hours = 24 * (LOOKBACK_DAYS + days)
+    crags = [
+        {"name": name, "lat": lat, "lng": lng, "error": res.get("reason", "No data returned.")}
+        for lat, lng, name, res in zip(lats, lngs, names, responses)
+    ]
+    options = []
+    local_days = []
+    if ok:
+        fetched = [responses[i] for i in ok]
+        local_now = [datetime.now(timezone.utc) + timedelta(seconds=res.get("utc_offset_seconds", 0))
+                     for res in fetched]
+        local_days = [now.date() for now in local_now]
+        offsets = [24 * ((day - start).days - LOOKBACK_DAYS) for day in local_days]
+        temp, humidity, precip, codes, is_day = (_stack(fetched, f, hours, offsets) for f in HOURLY_FIELDS)
+
+        # Hours already gone today (the crag's today) can't be climbed
+        for row, now in enumerate(local_now):
+            is_day[row, :24 * LOOKBACK_DAYS + now.hour] = 0
+
+        scores, rain_48h = score_hours(temp, humidity, precip, codes, is_day)
+
+        # Drop the lookback and fold into (locations, days, 24)
+        def by_day(a):
+            return a[:, 24 * LOOKBACK_DAYS:].reshape(len(ok), days, 24)
+
+        scores, temp, humidity, rain_48h = by_day(scores), by_day(temp), by_day(humidity), by_day(rain_48h)
+        daylight = by_day(is_day) == 1
+        hazard = (np.isin(by_day(codes), HAZARD_CODES) & daylight).any(axis=2)
+
+        best, window_start = _best_windows(scores)
+        rain_at_start = np.take_along_axis(rain_48h, window_start[..., None], axis=2)[..., 0]
+        with warnings.catch_warnings():
+            # Days without daylight left are all-NaN; they are skipped below anyway
+            warnings.simplefilter("ignore", RuntimeWarning)
+            low = np.nanmin(np.where(daylight, temp, np.nan), axis=2)
+            high = np.nanmax(np.where(daylight, temp, np.nan), axis=2)
+            max_humidity = np.nanmax(np.where(daylight, humidity, np.nan), axis=2)
+
+        for row, i in enumerate(ok):
+            ranked = []
+            for d in np.argsort(-best[row], kind="stable"):
+                if not np.isfinite(best[row, d]):
+                    continue
+                h = int(window_start[row, d])
+                entry = {
+                    "date": (local_days[row] + timedelta(days=int(d))).isoformat(),
+                    "score": round(float(best[row, d]), 2),
+                    "status": _status(best[row, d]),
+                    "window": f"{h:02d}:00-{h + SESSION_HOURS:02d}:00",
+                    "temp_f": f"{low[row, d]:.0f}° to {high[row, d]:.0f}°",
+                    "max_humidity_pct": None if np.isnan(max_humidity[row, d]) else int(max_humidity[row, d]),
+                    "rain_48h_in": round(float(rain_at_start[row, d]), 2),
+                    "hazard": bool(hazard[row, d]),
+                }
+                ranked.append(entry)
+                options.append({"name": names[i], "date": entry["date"], "window": entry["window"],
+                                "score": entry["score"], "status": entry["status"]})
+            crags[i] = {"name": names[i], "lat": lats[i], "lng": lngs[i], "days": ranked}
+
+    options.sort(key=lambda o: o["score"], reverse=True)
+    return {"from": min(local_days, default=today).isoformat(), "days": days, "best": options[:TOP_OPTIONS],
+            "crags": crags, "row_count": len(crags)}
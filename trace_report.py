@@ -0,0 +1,73 @@
+import argparse
+import glob
+import gzip
+import json
+import math
+from collections import defaultdict
+
+from tracing import TRACE_PATH
+
+
+def load_traces(path: str = TRACE_PATH) -> list[dict]:
+    """Reads the live trace file plus any rotated .gz backups next to it."""
+    entries = []
+    for file_path in sorted(glob.glob(f"{path}.*.gz"), reverse=True) + [path]:
+        opener = gzip.open if file_path.endswith(".gz") else open
+        try:
+            with opener(file_path, "rt") as f:
+                for line in f:
+                    if line.strip():
+                        entries.append(json.loads(line))
+        except FileNotFoundError:
+            continue
+    return entries
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(entries: list[dict]) -> dict:
+    """Groups durations (ms) into per-request, per-stage and per-tool buckets."""
+    groups = defaultdict(list)
+    for entry in entries:
+        if "event" in entry:
+            # App render timings (rerun / cold_start), not requests
+            groups[f"app:{entry['event']}"].append(entry["duration_ms"])
+            continue
+        if "duration_ms" in entry:
+            groups["request"].append(entry["duration_ms"])
+        if "route" in entry and "duration_ms" in entry:
+            # fast:* vs agent shows what the router saves per request
+            groups[f"route:{entry['route']}"].append(entry["duration_ms"])
+        if "ttft_ms" in entry:
+            groups["time_to_first_token"].append(entry["ttft_ms"])
+            if "route" in entry:
+                # Cache and fast-path answers arrive in one piece, so they'd hide the agent's TTFT
+                groups[f"ttft:{entry['route']}"].append(entry["ttft_ms"])
+        for s in entry.get("spans", []):
+            groups[f"stage:{s['stage']}"].append(s["duration_ms"])
+            if s["stage"] == "tool":
+                groups[f"tool:{s['name']}"].append(s["duration_ms"])
+    return groups
+
+
+def print_report(groups: dict):
+    print(f"{'group':<40} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name in sorted(groups):
+        values = groups[name]
+        print(f"{name:<40} {len(values):>6} {percentile(values, 50):>9.1f} "
+              f"{percentile(values, 95):>9.1f} {percentile(values, 99):>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency percentiles (ms) per stage and per tool from traces.jsonl")
+    parser.add_argument("path", nargs="?", default=TRACE_PATH)
+    args = parser.parse_args()
+
+    traces = load_traces(args.path)
+    print(f"--- {len(traces)} traces ---")
+    print_report(summarize(traces))
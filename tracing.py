@@ -0,0 +1,157 @@
+import atexit
+import contextvars
+import functools
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_PATH = "traces.jsonl"
+# Rotate once the live file passes this size, keeping this many gzipped backups.
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 5
+# Entries queued beyond this are dropped rather than blocking a request.
+TRACE_QUEUE_SIZE = 1000
+FLUSH_INTERVAL = 1.0
+
+# Spans recorded by the current request; None outside of trace()
+_spans = contextvars.ContextVar("trace_spans", default=None)
+
+
+class TraceWriter:
+    """
+    Appends trace entries to a JSONL file from a background thread.
+
+    write() only enqueues, so the request path never touches the disk. The thread
+    batches whatever is queued, flushes at most every FLUSH_INTERVAL seconds and
+    rotates the file to <path>.1.gz, <path>.2.gz, ... once it grows past max_bytes.
+    """
+
+    def __init__(self, path: str = TRACE_PATH, max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write(self, entry: dict):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0):
+        """Blocks until everything queued so far is on disk (or timeout passes)."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            # Keep collecting until the interval is up or someone is waiting on a flush
+            while not isinstance(batch[-1], threading.Event) and time.monotonic() < deadline:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list):
+        entries = [item for item in batch if not isinstance(item, threading.Event)]
+        if entries:
+            with open(self.path, "a") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, default=str) + "\n")
+            if os.path.getsize(self.path) > self.max_bytes:
+                self._rotate()
+        for item in batch:
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}.gz"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}.gz")
+        with open(self.path, "rb") as src, gzip.open(f"{self.path}.1.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        open(self.path, "w").close()
+
+
+writer = TraceWriter()
+
+
+@contextmanager
+def trace(**fields):
+    """
+    Collects the spans of one request and hands the finished entry to the writer.
+
+    The yielded dict is the trace entry; callers add fields (e.g. final_answer) to it.
+    """
+    spans = []
+    token = _spans.set(spans)
+    entry = {"timestamp": datetime.now().isoformat(), **fields, "spans": spans}
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        _spans.reset(token)
+        writer.write(entry)
+
+
+@contextmanager
+def span(name: str, stage: str, **attrs):
+    """
+    Times a block and records it on the current trace.
+
+    stage groups spans in reports ("llm", "tool", "http", "sql"). The yielded dict
+    can be used to attach more attributes, e.g. response_bytes. Outside of trace()
+    this only costs the timing.
+    """
+    record = {"name": name, "stage": stage, **attrs}
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append(record)
+
+
+def traced_tool(func):
+    """Wraps an agent tool so each call is recorded as a 'tool' span with its result size."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with span(func.__name__, "tool", args=kwargs or list(args)) as record:
+            result = func(*args, **kwargs)
+            record["response_bytes"] = len(json.dumps(result, default=str))
+            return result
+    return wrapper
+
+
+def bind(func):
+    """Carries the current trace into a worker thread: executor.submit(bind(fn), ...)."""
+    return functools.partial(contextvars.copy_context().run, func)
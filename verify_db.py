@@ -8,21 +8,35 @@ def verify_data():
 
     # 1. Total Count
     cursor.execute("SELECT COUNT(*) FROM boulders")
-    print(f"Total Boulders Ingested: {cursor.fetchone()[0]}")
+    total = cursor.fetchone()[0]
+    print(f"Total Boulders Ingested: {total}")
+
+    # The breakdowns below come from boulder_counts, so make sure it agrees
+    cursor.execute("SELECT COALESCE(SUM(boulders), 0) FROM boulder_counts")
+    counted = cursor.fetchone()[0]
+    if counted != total:
+        print(f"WARNING: boulder_counts has {counted} boulders, expected {total}")
 
     # 2. Check Hierarchy Distribution
     print("\n--- Breakdown by Area and Sub-Area ---")
+    cursor.execute("SELECT area, sub_area, boulders, missing_gps FROM gps_coverage")
+    coverage = cursor.fetchall()
+    for area, sub_area, count, _ in coverage:
+        print(f"[{area}] -> {sub_area}: {count} boulders")
+
+    print("\n--- Grade Histogram ---")
     cursor.execute("""
-        SELECT area, sub_area, COUNT(*) 
-        FROM boulders 
-        GROUP BY area, sub_area
+        SELECT grade_bucket, SUM(boulders)
+        FROM grade_histogram
+        GROUP BY grade_bucket
+        ORDER BY grade_bucket
     """)
-    for area, sub_area, count in cursor.fetchall():
-        print(f"[{area}] -> {sub_area}: {count} boulders")
+    for bucket, count in cursor.fetchall():
+        label = "V?" if bucket is None else "VB" if bucket == -1 else f"V{bucket}"
+        print(f"{label}: {count}")
 
     # 3. Check Coordinate Coverage
-    cursor.execute("SELECT COUNT(*) FROM boulders WHERE lat IS NULL OR lng IS NULL")
-    missing_gps = cursor.fetchone()[0]
+    missing_gps = sum(row[3] for row in coverage)
     print(f"\nBoulders missing GPS: {missing_gps}")
 
     # 4. Preview a specific "Problem Child" (e.g., Gunks)
@@ -1,69 +1,242 @@
+import os
+import sqlite3
 import requests
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from cache import MemoryCache, SQLiteCache
+from conditions import get_store
+from http_client import get_json
+from tracing import bind
 
-def get_bouldering_weather(lat: float, lng: float, date_str: str = None):
-    """
-    Evaluates climbing conditions by checking 48h rain history and future forecasts.
-    
-    This tool is essential for bouldering safety and quality. It specifically checks for:
-    1. Seepage: Heavy rain in the last 48h makes many rock types (sandstone/limestone) 
-       fragile and unclimbable even if the sun is out.
-    2. Hazards: Identifies snow, hail, and thunderstorms which are dangerous for outdoor climbing.
-    3. Daylight: Filters weather data to only show conditions during actual climbing hours.
+ARCHIVE_URL = os.environ.get("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+FORECAST_URL = os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Open-Meteo serves the forecast from ~0.1° model cells and the archive from the
+# 0.25° ERA5 grid, so every crag inside one cell gets identical data back.
+FORECAST_GRID = 0.1
+ARCHIVE_GRID = 0.25
+
+# Forecasts get revised every model run, so only hold them for a few minutes.
+FORECAST_TTL = 10 * 60
+# ERA5 lags a few days behind and backfills recent days, after that it never changes.
+ARCHIVE_SETTLE_DAYS = 5
+ARCHIVE_TTL = 60 * 60
+ARCHIVE_FINAL_TTL = 30 * 24 * 60 * 60
+
+# Upper bound on how long a tool call waits for Open-Meteo, retries included.
+FETCH_DEADLINE = 20
+# (connect, read) seconds per Open-Meteo attempt. http_client makes up to 3 attempts
+# with ~1s of backoff, so 3 x 6.05s + 1s keeps even a worker the deadline gave up on
+# from holding a pool thread much past FETCH_DEADLINE.
+FETCH_TIMEOUT = (3.05, 3)
+
+# Names of agent tools whose answers depend on the forecast; answer_cache gives
+# those answers FORECAST_TTL. Add new tools with @forecast_tool.
+FORECAST_TOOLS = set()
+
+_cache = SQLiteCache() if os.environ.get("BOULDER_WEATHER_CACHE") == "sqlite" else MemoryCache()
+# Archive and forecast fetches run side by side on this pool.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="weather")
 
-    IMPORTANT: get_coordinates must be called first to supply the correct lat and lng for get_bouldering_weather.
+
+def forecast_tool(func):
+    """Marks an agent tool as forecast-backed so cached answers that used it expire with the forecast."""
+    FORECAST_TOOLS.add(func.__name__)
+    return func
+
+
+def configure_cache(backend: str = "memory", **kwargs):
+    """
+    Swaps the weather cache backend.
 
     Args:
-        lat (float): The latitude of the specific crag or rock.
-        lng (float): The longitude of the specific crag or rock.
-        date_str (str, optional): Target trip date in 'YYYY-MM-DD' format. Defaults to today.
+        backend (str): "memory" for an in-process LRU or "sqlite" for a file-backed
+                       cache that survives Streamlit restarts.
+        **kwargs: Passed to the backend (maxsize for memory, path for sqlite).
+    """
+    global _cache
+    if backend == "sqlite":
+        _cache = SQLiteCache(**kwargs)
+    elif backend == "memory":
+        _cache = MemoryCache(**kwargs)
+    else:
+        raise ValueError(f"Unknown cache backend: {backend}")
 
-    Returns:
-        dict: A status report including 'status' (Green/Yellow/Red), 'reason', and local metrics.
+
+def cache_stats() -> dict:
+    """Returns hit/miss counters for the weather cache (each hit is one API call saved)."""
+    return _cache.stats()
+
+
+def snap(value: float, step: float) -> float:
+    """Snaps a coordinate to the centre of its weather model grid cell."""
+    return round(round(value / step) * step, 4)
+
+
+def conditions_cells(lat: float, lng: float) -> tuple:
+    """The (forecast, archive) grid cells a point's weather comes from; the conditions store key."""
+    return (snap(lat, FORECAST_GRID), snap(lng, FORECAST_GRID), snap(lat, ARCHIVE_GRID), snap(lng, ARCHIVE_GRID))
+
+
+def _fetch_many(kind: str, url: str, grid: float, coords: list, params: dict, ttl: float) -> list[dict]:
     """
-    
-    # Calculate the 48-hour 'Lookback' period to check if the rock is currently soaked.
-    target_date = datetime.strptime(date_str, '%Y-%m-%d') if date_str else datetime.now()
-    history_end = target_date.date()
-    history_start = history_end - timedelta(days=2)
+    Fetches one Open-Meteo response per coordinate, serving what it can from the cache.
 
-    # Most bouldering areas require at least 24-48 hours to dry after > 0.1" of rain.
-    archive_url = "https://archive-api.open-meteo.com/v1/archive"
+    All cache misses go out in a single request: Open-Meteo accepts comma-separated
+    latitude/longitude lists and answers with a list of per-location objects.
+    """
+    snapped = [(snap(lat, grid), snap(lng, grid)) for lat, lng in coords]
+    window = ":".join(str(params[k]) for k in ("start_date", "end_date"))
+
+    found = {}
+    missing = []
+    for point in dict.fromkeys(snapped):
+        cached = _cache.get(f"{kind}:{point[0]}:{point[1]}:{window}")
+        if cached is not None:
+            found[point] = cached
+        else:
+            missing.append(point)
+
+    if missing:
+        batch_params = dict(params)
+        batch_params["latitude"] = ",".join(str(p[0]) for p in missing)
+        batch_params["longitude"] = ",".join(str(p[1]) for p in missing)
+        res = get_json(url, params=batch_params, timeout=FETCH_TIMEOUT)
+        # A single location (or an error) comes back as a bare object
+        responses = res if isinstance(res, list) else [res] * len(missing)
+        for point, data in zip(missing, responses):
+            found[point] = data
+            if not data.get('error'):
+                _cache.set(f"{kind}:{point[0]}:{point[1]}:{window}", data, ttl)
+
+    return [found[point] for point in snapped]
+
+
+def _fetch_archive(coords: list, start: date, end: date) -> list[dict]:
     archive_params = {
-        "latitude": lat, "longitude": lng,
-        "start_date": history_start.strftime('%Y-%m-%d'),
-        "end_date": history_end.strftime('%Y-%m-%d'),
+        "start_date": start.strftime('%Y-%m-%d'),
+        "end_date": end.strftime('%Y-%m-%d'),
         "daily": "precipitation_sum",
         "precipitation_unit": "inch",
         "timezone": "auto"
     }
-    archive_res = requests.get(archive_url, params=archive_params).json()
-    past_rain = sum(archive_res.get('daily', {}).get('precipitation_sum', []))
+    settled = end <= date.today() - timedelta(days=ARCHIVE_SETTLE_DAYS)
+    ttl = ARCHIVE_FINAL_TTL if settled else ARCHIVE_TTL
+    return _fetch_many("archive", ARCHIVE_URL, ARCHIVE_GRID, coords, archive_params, ttl)
 
-    # We fetch hourly data but filter by sunrise/sunset to ignore night-time rain.
-    forecast_url = "https://api.open-meteo.com/v1/forecast"
+
+def _fetch_forecast(coords: list, day: date) -> list[dict]:
     forecast_params = {
-        "latitude": lat, "longitude": lng,
-        "start_date": target_date.strftime('%Y-%m-%d'),
-        "end_date": target_date.strftime('%Y-%m-%d'),
+        "start_date": day.strftime('%Y-%m-%d'),
+        "end_date": day.strftime('%Y-%m-%d'),
         "hourly": ["temperature_2m", "precipitation", "weather_code", "relative_humidity_2m"],
         "daily": ["sunrise", "sunset"],
         "temperature_unit": "fahrenheit",
         "precipitation_unit": "inch",
         "timezone": "auto"
     }
-    f_res = requests.get(forecast_url, params=forecast_params).json()
-    
+    return _fetch_many("forecast", FORECAST_URL, FORECAST_GRID, coords, forecast_params, FORECAST_TTL)
+
+
+def fetch_hourly(coords: list, start: date, end: date, hourly: list[str]) -> list[dict]:
+    """
+    Fetches hourly forecast series (°F, inches, local time) for each (lat, lng)
+    from start through end, in one batched, cached request.
+
+    Raises requests.RequestException if Open-Meteo can't be reached.
+    """
+    params = {
+        "start_date": start.strftime('%Y-%m-%d'),
+        "end_date": end.strftime('%Y-%m-%d'),
+        "hourly": hourly,
+        "temperature_unit": "fahrenheit",
+        "precipitation_unit": "inch",
+        "timezone": "auto"
+    }
+    return _fetch_many(f"hourly:{','.join(hourly)}", FORECAST_URL, FORECAST_GRID, coords, params, FORECAST_TTL)
+
+
+def _history_window(date_str: str | None) -> tuple:
+    # Calculate the 48-hour 'Lookback' period to check if the rock is currently soaked.
+    target_date = datetime.strptime(date_str, '%Y-%m-%d') if date_str else datetime.now()
+    # The archive rejects end dates it doesn't have yet, so for a future trip date this
+    # is the rain of the last 48h up to today
+    history_end = min(target_date.date(), date.today())
+    history_start = history_end - timedelta(days=2)
+    return target_date.date(), history_start, history_end
+
+
+def _fetch_both(coords: list, date_str: str | None) -> tuple:
+    """
+    Runs the archive and forecast fetches concurrently.
+
+    Returns (target_date, archives, forecasts, errors). A side that failed or blew
+    the deadline comes back as None, with its error message in errors.
+    """
+    target_date, history_start, history_end = _history_window(date_str)
+    jobs = {
+        "rain history": _executor.submit(bind(_fetch_archive), coords, history_start, history_end),
+        "forecast": _executor.submit(bind(_fetch_forecast), coords, target_date),
+    }
+    # One deadline for both sides, not FETCH_DEADLINE each
+    wait(jobs.values(), timeout=FETCH_DEADLINE)
+    results, errors = {}, {}
+    for side, job in jobs.items():
+        if not job.done():
+            results[side] = None
+            errors[side] = f"Open-Meteo did not answer within {FETCH_DEADLINE}s."
+            continue
+        try:
+            results[side] = job.result()
+        except requests.HTTPError as e:
+            results[side] = None
+            errors[side] = f"Open-Meteo returned HTTP {e.response.status_code}."
+        except (requests.RequestException, ValueError) as e:
+            # Keep the message short, it ends up in the model's context
+            results[side] = None
+            errors[side] = f"Open-Meteo request failed ({type(e).__name__})."
+    return target_date, results["rain history"], results["forecast"], errors
+
+
+def _evaluate(archive_res: dict | None, f_res: dict | None, errors: dict | None = None) -> dict:
+    """
+    Turns one location's archive and forecast responses into a Green/Yellow/Red report.
+
+    Either response may be missing (None or an Open-Meteo error body), in which case
+    the report is built from whatever is left and flagged as 'partial'.
+    """
+    errors = dict(errors or {})
+    if archive_res is not None and 'daily' not in archive_res:
+        errors.setdefault("rain history", archive_res.get('reason', "No data returned."))
+        archive_res = None
+    if f_res is not None and 'daily' not in f_res:
+        errors.setdefault("forecast", f_res.get('reason', "No data returned."))
+        f_res = None
+    if archive_res is None and f_res is None:
+        return {"error": "Weather data unavailable.", "details": errors}
+
+    # Most bouldering areas require at least 24-48 hours to dry after > 0.1" of rain.
+    # The archive reports null for days it hasn't backfilled yet.
+    past_rain = None
+    if archive_res is not None:
+        past_rain = sum(p or 0 for p in archive_res['daily'].get('precipitation_sum', []))
+
     # Extract daylight hours
-    sunrise = datetime.fromisoformat(f_res['daily']['sunrise'][0])
-    sunset = datetime.fromisoformat(f_res['daily']['sunset'][0])
-    
-    hourly = f_res.get('hourly', {})
+    daylight_window = None
+    hourly = {}
+    daylight = slice(0, 0)
+    if f_res is not None:
+        sunrise = datetime.fromisoformat(f_res['daily']['sunrise'][0])
+        sunset = datetime.fromisoformat(f_res['daily']['sunset'][0])
+        daylight_window = f"{sunrise.strftime('%I:%M %p')} - {sunset.strftime('%I:%M %p')}"
+        hourly = f_res.get('hourly', {})
+        daylight = slice(sunrise.hour, sunset.hour)
+
     # Slice arrays to only look at hours between sunrise and sunset
-    day_temps = hourly.get('temperature_2m', [])[sunrise.hour:sunset.hour]
-    day_precip = sum(hourly.get('precipitation', [])[sunrise.hour:sunset.hour])
-    day_codes = hourly.get('weather_code', [])[sunrise.hour:sunset.hour]
-    day_humidity = hourly.get('relative_humidity_2m', [])[sunrise.hour:sunset.hour]
+    day_temps = hourly.get('temperature_2m', [])[daylight]
+    day_precip = sum(p or 0 for p in hourly.get('precipitation', [])[daylight])
+    day_codes = hourly.get('weather_code', [])[daylight]
+    day_humidity = hourly.get('relative_humidity_2m', [])[daylight]
 
     max_day_temp = max(day_temps) if day_temps else 0
     min_day_temp = min(day_temps) if day_temps else 0
@@ -77,7 +250,7 @@ def get_bouldering_weather(lat: float, lng: float, date_str: str = None):
     status = "Green"
     reasons = []
 
-    if past_rain > 0.15:
+    if past_rain is not None and past_rain > 0.15:
         status = "Red"
         reasons.append(f"Recent Rain: {past_rain:.2f}\" in the last 48h likely caused seepage.")
     if day_precip > 0.02:
@@ -92,16 +265,118 @@ def get_bouldering_weather(lat: float, lng: float, date_str: str = None):
     if max_day_temp > 80:
         status = "Yellow"
         reasons.append(f"Sub-optimal Temps: High of {max_day_temp}°F is a bit warm/greasy.")
-    if min_day_temp < 32:
+    if day_temps and min_day_temp < 32:
         status = "Yellow"
         reasons.append(f"Sub-optimal Temps: Low of {min_day_temp}°F is quite cold.")
+    for side in errors:
+        reasons.append(f"Missing Data: {side} unavailable, verdict is based on partial data.")
 
-    return {
+    report = {
         "status": status,
         "verdict": " | ".join(reasons) if reasons else "Prime bouldering conditions.",
         "metrics": {
-            "temp_f": f"{min(day_temps)}° to {max(day_temps)}°",
-            "daylight_window": f"{sunrise.strftime('%I:%M %p')} - {sunset.strftime('%I:%M %p')}",
-            "historical_rain_in": round(past_rain, 2)
+            "temp_f": f"{min_day_temp}° to {max_day_temp}°" if day_temps else None,
+            "max_humidity_pct": max_humidity if day_humidity else None,
+            "daylight_window": daylight_window,
+            "historical_rain_in": round(past_rain, 2) if past_rain is not None else None
         }
-    }
\ No newline at end of file
+    }
+    if errors:
+        report["partial"] = True
+        report["errors"] = errors
+    return report
+
+
+def evaluate_locations(coords: list, date_str: str | None = None, use_store: bool = True) -> tuple:
+    """
+    Builds the Green/Yellow/Red report for each (lat, lng) on one date.
+
+    Fresh reports precomputed by the conditions scheduler are read from the store
+    first (unless use_store is False) and only the remaining locations are fetched
+    live. Returns (target_date, reports).
+    """
+    target_date = _history_window(date_str)[0]
+    day = target_date.strftime('%Y-%m-%d')
+    cells = [conditions_cells(lat, lng) for lat, lng in coords]
+
+    reports = [None] * len(coords)
+    if use_store:
+        try:
+            reports = [get_store().get(day, c) for c in cells]
+        except sqlite3.Error:
+            # The store is only a shortcut, a broken one just means live fetches
+            pass
+
+    missing = [i for i, report in enumerate(reports) if report is None]
+    if missing:
+        _, archives, forecasts, errors = _fetch_both([coords[i] for i in missing], day)
+        archives = archives or [None] * len(missing)
+        forecasts = forecasts or [None] * len(missing)
+        for i, archive_res, f_res in zip(missing, archives, forecasts):
+            reports[i] = _evaluate(archive_res, f_res, errors)
+    return target_date, reports
+
+
+@forecast_tool
+def get_bouldering_weather(lat: float, lng: float, date_str: str = None):
+    """
+    Evaluates climbing conditions by checking 48h rain history and future forecasts.
+    
+    This tool is essential for bouldering safety and quality. It specifically checks for:
+    1. Seepage: Heavy rain in the last 48h makes many rock types (sandstone/limestone) 
+       fragile and unclimbable even if the sun is out.
+    2. Hazards: Identifies snow, hail, and thunderstorms which are dangerous for outdoor climbing.
+    3. Daylight: Filters weather data to only show conditions during actual climbing hours.
+
+    IMPORTANT: get_coordinates must be called first to supply the correct lat and lng for get_bouldering_weather.
+
+    Args:
+        lat (float): The latitude of the specific crag or rock.
+        lng (float): The longitude of the specific crag or rock.
+        date_str (str, optional): Target trip date in 'YYYY-MM-DD' format. Defaults to today.
+
+    Returns:
+        dict: A status report including 'status' (Green/Yellow/Red), 'reason', and local metrics.
+    """
+    # We fetch hourly data but filter by sunrise/sunset to ignore night-time rain.
+    # Known areas are usually precomputed by the conditions scheduler.
+    _, reports = evaluate_locations([(lat, lng)], date_str)
+    return reports[0]
+
+
+@forecast_tool
+def get_bouldering_weather_many(lats: list[float], lngs: list[float], date_str: str = None,
+                                names: list[str] | None = None) -> dict:
+    """
+    Evaluates climbing conditions for several crags at once on the same date.
+
+    Use this instead of repeated get_bouldering_weather calls for comparative questions
+    such as "where is it dry this weekend, Trapps or Peterskill?". Each location gets the
+    same Green/Yellow/Red report as get_bouldering_weather.
+
+    IMPORTANT: get_coordinates must be called first for every location.
+
+    Args:
+        lats (list[float]): Latitudes of the crags, in the same order as lngs.
+        lngs (list[float]): Longitudes of the crags, in the same order as lats.
+        date_str (str, optional): Target trip date in 'YYYY-MM-DD' format. Defaults to today.
+        names (list[str], optional): Labels for the crags, echoed back in the results.
+
+    Returns:
+        dict: 'date' plus a 'locations' list with 'name', 'lat', 'lng', 'status',
+              'verdict' and 'metrics' for each crag, in input order, and 'row_count'.
+    """
+    if len(lats) != len(lngs):
+        return {"error": "lats and lngs must have the same length."}
+    if names and len(names) != len(lats):
+        return {"error": "names must have one entry per location."}
+    names = names or [None] * len(lats)
+    coords = list(zip(lats, lngs))
+
+    target_date, reports = evaluate_locations(coords, date_str)
+    locations = [
+        {"name": name, "lat": lat, "lng": lng, **report}
+        for (lat, lng), name, report in zip(coords, names, reports)
+    ]
+
+    return {"date": target_date.strftime('%Y-%m-%d'), "locations": locations, "row_count": len(locations)}